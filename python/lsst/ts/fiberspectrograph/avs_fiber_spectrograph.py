@@ -30,12 +30,14 @@ __all__ = [
 ]
 
 import asyncio
+import concurrent.futures
 import ctypes
 import dataclasses
 import enum
 import logging
-import struct
-import time
+import sys
+import threading
+import weakref
 
 import astropy.units as u
 import numpy as np
@@ -48,6 +50,13 @@ LIBRARY_PATH = "/usr/local/lib/libavs.so.0.2.0"
 MIN_DURATION = 0.000002
 MAX_DURATION = 600
 
+# Signature of the callback passed to ``AVS_Measure``, which libavs calls
+# from its own thread when a measurement is ready for readout:
+# ``void callback(AvsHandle *handle, int *result)``
+AvsMeasureCallback = ctypes.CFUNCTYPE(
+    None, ctypes.POINTER(ctypes.c_long), ctypes.POINTER(ctypes.c_int)
+)
+
 
 class AvsReturnError(Exception):
     """Exception raised if an ``AVS_*`` C function returns an error code.
@@ -61,13 +70,9 @@ class AvsReturnError(Exception):
     """
 
     def __init__(self, code, what):
-        try:
-            self.code = AvsReturnCode(code)
-            self._valid = True
-        except ValueError:
-            # unknown error codes are handled with a separate message.
-            self._valid = False
-            self.code = code
+        # unknown error codes are handled with a separate message.
+        self.code = _AVS_RETURN_CODES.get(code, code)
+        self._valid = isinstance(self.code, AvsReturnCode)
         self.what = what
 
     def __str__(self):
@@ -110,10 +115,17 @@ class AvsFiberSpectrograph:
     This class follows Resource acquisition is initialization (RAII): when
     instantiated, it opens a connection; if it cannot open a connection, it
     raises an exception. To reconnect, delete the object and create a new one.
+    It can also be used as a context manager, which disconnects on exit.
 
     This class requires that ``libavs.so`` be installed in ``/usr/local/lib``.
     It is compatible with libavs version 0.2.0.
 
+    Connecting, and the synchronous methods that talk to the device
+    (`get_status`, `refresh_static`, `stop_exposure`, `disconnect`), block
+    until libavs returns. Do not call them from a coroutine running on an
+    event loop: create the instance in a worker thread (e.g. with
+    `asyncio.to_thread`) and use the ``*_async`` variants instead.
+
     Parameters
     ----------
     serial_number : `str`, optional
@@ -151,27 +163,64 @@ class AvsFiberSpectrograph:
 
         if log_to_stdout:
             self.log.setLevel(logging.DEBUG)
-            import sys
-
-            logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+            # Reconnecting creates a new instance; only add one handler.
+            if not any(
+                isinstance(handler, logging.StreamHandler)
+                and handler.stream is sys.stdout
+                for handler in self.log.handlers
+            ):
+                self.log.addHandler(logging.StreamHandler(sys.stdout))
 
         # How long to wait before we timeout on when polling for new data.
         # From the vendor docs, readout+transfer should be about 10ms, so we
         # can make this half a second and still be very safe.
         self.pollscan_timeout = 0.5  # seconds
 
-        # create a "done" future
-        self._expose_task = asyncio.Future()
-        self._expose_task.set_result(None)
-
-        self.libavs = ctypes.CDLL(LIBRARY_PATH)
-
-        # NOTE: AVS_Init(0) initializes the USB library, not device 0.
-        self.libavs.AVS_Init(0)
+        # The task of the current or last exposure; None until the first.
+        # (Not a "done" future, which would tie construction to an event
+        # loop, and `AvsFiberSpectrograph` may be made in a worker thread.)
+        self._expose_task = None
+        # The callback for the current measurement; see `_do_expose`.
+        self._measure_callback = None
+        # Whether libavs may still call ``_measure_callback``, i.e. a
+        # measurement was started and has not finished or been stopped.
+        self._measuring = False
+        self._exposure_lock = asyncio.Lock()
+
+        # Scratch buffers for the libavs output arguments, allocated once
+        # and reused on every call.
+        self._uint_ptr = ctypes.pointer(ctypes.c_uint())
+        self._ushort_ptr = ctypes.pointer(ctypes.c_ushort())
+        self._float_ptr = ctypes.pointer(ctypes.c_float())
+        self._fpga_buf = (ctypes.c_ubyte * 16)()
+        self._firmware_buf = (ctypes.c_ubyte * 16)()
+        self._library_buf = (ctypes.c_ubyte * 16)()
+        self._config_buf = AvsDeviceConfig()
+        # Fields of `get_status` that are fixed while connected; filled in by
+        # `refresh_static`.
+        self._static_status = None
+        self._temperature_fit = None
+
+        # All libavs calls on the device, from connecting to it onwards, are
+        # made from this one thread, so that they are never made concurrently
+        # (libavs is not documented to be thread safe). The ``*_async``
+        # methods wait for them without blocking the event loop.
+        self._ffi_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="avs-ffi",
+        )
 
-        self._configure_ctypes()
+        self.libavs = _acquire_libavs()
+        # Release the library if we are garbage collected without calling
+        # `disconnect`; `_connect` replaces this to also deactivate the
+        # device once it is connected.
+        self._finalizer = weakref.finalize(self, _release_libavs, self.libavs)
 
-        self._connect(serial_number)
+        try:
+            self._call_sync(self._connect, serial_number)
+        except Exception:
+            self._ffi_executor.shutdown(wait=False)
+            raise
 
     def _connect(self, serial_number=None):
         """Establish a connection with a single USB spectrograph.
@@ -193,19 +242,7 @@ class AvsFiberSpectrograph:
         AvsReturnError
             Raised if there is an error connecting to the requested device.
         """
-        n_devices = self.libavs.AVS_UpdateUSBDevices()
-        if n_devices == 0:
-            raise RuntimeError("No attached USB Avantes devices found.")
-        self.log.debug("Found %d attached USB Avantes device(s).", n_devices)
-
-        required_size = _getUIntPointer(n_devices * ctypes.sizeof(AvsIdentity))
-        device_list = _getAvsIdentityArrayPointer(n_devices)
-
-        code = self.libavs.AVS_GetList(
-            required_size.contents.value, required_size, device_list
-        )
-        assert_avs_code(code, "GetList (device list)")
-        device_list = list(device_list)  # unpack the array pointer
+        device_list = self._enumerate()
         self.log.debug("Found devices: %s", device_list)
 
         if serial_number is None:
@@ -216,15 +253,19 @@ class AvsFiberSpectrograph:
                 )
             device = device_list[0]
         else:
+            # SerialNumber is returned as bytes with trailing NULs stripped.
+            # If several devices report the same serial number, use the first.
+            by_serial = {}
             for device in device_list:
-                if serial_number == device.SerialNumber.decode("ascii"):
-                    break
-            else:
-                msg = f"Device {serial_number=} not found in {device_list=}. "
-                "Check that the component deployed using the correct index?"
-                raise LookupError(msg)
+                by_serial.setdefault(device.SerialNumber, device)
+            device = by_serial.get(serial_number.encode("ascii"))
+            if device is None:
+                raise LookupError(
+                    f"Device {serial_number=} not found in {device_list=}. "
+                    "Check that the component deployed using the correct index?"
+                )
 
-        statusCode = AvsDeviceStatus(struct.unpack("B", device.Status)[0])
+        statusCode = AvsDeviceStatus(ord(device.Status))
         if statusCode != AvsDeviceStatus.USB_AVAILABLE:
             raise RuntimeError(
                 f"Requested AVS device is already in use: {repr(statusCode)}"
@@ -236,16 +277,68 @@ class AvsFiberSpectrograph:
             raise RuntimeError(
                 f"Invalid device handle; cannot activate device {device}."
             )
+        self._finalizer.detach()
+        self._finalizer = weakref.finalize(
+            self, _close_device, self.libavs, self.handle, self.log
+        )
         self.log.info(
             "Activated connection (handle=%s) with USB device %s.", self.handle, device
         )
         self.device = device
 
         # store the number of pixels for use when taking exposures.
-        n_pixels = _getUShortPointer()
-        code = self.libavs.AVS_GetNumPixels(self.handle, n_pixels)
+        code = self.libavs.AVS_GetNumPixels(self.handle, self._ushort_ptr)
         assert_avs_code(code, "GetNumPixels")
-        self._n_pixels = n_pixels.contents.value
+        self._n_pixels = self._ushort_ptr.contents.value
+
+        # Readout arrays for `expose`, which libavs writes into directly.
+        self._wavelength_buf = _aligned_buffer(self._n_pixels)
+        self._wavelength_ptr = self._wavelength_buf.ctypes.data_as(
+            ctypes.POINTER(ctypes.c_double)
+        )
+        self._spectrum_buf = _aligned_buffer(self._n_pixels)
+        self._spectrum_ptr = self._spectrum_buf.ctypes.data_as(
+            ctypes.POINTER(ctypes.c_double)
+        )
+        # The measurement settings that are the same for every exposure;
+        # `_measure` copies this and only sets the integration time.
+        self._measure_config_template = bytes(
+            AvsMeasureConfig(StartPixel=0, StopPixel=self._n_pixels - 1, NrAverages=1)
+        )
+
+    def _enumerate(self):
+        """Return the attached USB devices.
+
+        The USB bus is enumerated on every call, so that the ``Status`` of
+        each device is current when `_connect` checks it.
+
+        Returns
+        -------
+        device_list : `tuple` [`AvsIdentity`]
+            The identities of the attached USB devices.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if no devices are attached.
+        AvsReturnError
+            Raised if there is an error getting the device list.
+        """
+        n_devices = self.libavs.AVS_UpdateUSBDevices()
+        if n_devices == 0:
+            raise RuntimeError("No attached USB Avantes devices found.")
+        self.log.debug("Found %d attached USB Avantes device(s).", n_devices)
+
+        required_size = self._uint_ptr
+        required_size.contents.value = n_devices * AVS_IDENTITY_SIZE
+        # An array can be passed where libavs expects an AvsIdentity pointer.
+        device_list = (AvsIdentity * n_devices)()
+
+        code = self.libavs.AVS_GetList(
+            required_size.contents.value, required_size, device_list
+        )
+        assert_avs_code(code, "GetList (device list)")
+        return tuple(device_list)
 
     def disconnect(self):
         """Close the connection with the connected USB spectrograph.
@@ -256,30 +349,71 @@ class AvsFiberSpectrograph:
         Notes
         -----
         This method should not raise.
+
+        This blocks until libavs returns, so do not call it from the event
+        loop; use `disconnect_async` instead.
         """
         try:
-            if self.handle is not None and self.handle != AvsReturnCode.invalidHandle:
+            handle = self.handle
+            if handle is not None and handle != AvsReturnCode.invalidHandle:
                 try:
                     self.stop_exposure()  # stop any active exposure
                 except Exception as e:
-                    self.log.error(
-                        "Error stopping exposure during disconnect. %s: %s",
-                        type(e).__name__,
-                        e,
-                    )
-                result = self.libavs.AVS_Deactivate(self.handle)
-                if not result:
-                    self.log.error(
-                        "Could not deactivate device %s with handle %s. Assuming it is safe to "
-                        "close the communication port anyway.",
-                        self.device,
-                        self.handle,
-                    )
+                    self._log_stop_error(e)
+                # Clear the handle first, so that calling disconnect again
+                # does nothing even if deactivating fails.
+                self.handle = None
+                result = self._call_sync(self.libavs.AVS_Deactivate, handle)
+                self._check_deactivated(result, handle)
+        except Exception as e:
+            self.log.error("Error deactivating device. %s: %s", type(e).__name__, e)
+        finally:
+            self._release()
+
+    async def disconnect_async(self):
+        """Close the connection with the connected USB spectrograph, without
+        blocking the event loop.
+
+        See `disconnect` for details.
+        """
+        try:
+            handle = self.handle
+            if handle is not None and handle != AvsReturnCode.invalidHandle:
+                try:
+                    await self.stop_exposure_async()
+                except Exception as e:
+                    self._log_stop_error(e)
                 self.handle = None
+                result = await self._call(self.libavs.AVS_Deactivate, handle)
+                self._check_deactivated(result, handle)
         except Exception as e:
             self.log.error("Error deactivating device. %s: %s", type(e).__name__, e)
         finally:
-            self.libavs.AVS_Done()
+            self._release()
+
+    def _log_stop_error(self, error):
+        """Log an error stopping the exposure while disconnecting."""
+        self.log.error(
+            "Error stopping exposure during disconnect. %s: %s",
+            type(error).__name__,
+            error,
+        )
+
+    def _check_deactivated(self, result, handle):
+        """Log an error if ``AVS_Deactivate`` returned ``result`` False."""
+        if not result:
+            self.log.error(
+                "Could not deactivate device %s with handle %s. Assuming it is safe to "
+                "close the communication port anyway.",
+                self.device,
+                handle,
+            )
+
+    def _release(self):
+        """Shut down the libavs thread and release the library."""
+        self._ffi_executor.shutdown(wait=False)
+        if self._finalizer.detach() is not None:
+            _release_libavs(self.libavs)
 
     def get_status(self, full=False):
         """Get the status of the currently connected spectrograph.
@@ -290,7 +424,8 @@ class AvsFiberSpectrograph:
             Include the full `AvsDeviceConfig` structure in the output.
             This can be useful for understanding what other information is
             available from the spectrograph, but requires having the Avantes
-            manual on hand to decode it.
+            manual on hand to decode it. This also re-reads the values cached
+            by `refresh_static`.
 
         Returns
         -------
@@ -302,43 +437,102 @@ class AvsFiberSpectrograph:
         ------
         AvsReturnError
             Raised if there is an error querying the device.
+
+        Notes
+        -----
+        This blocks until libavs returns, so do not call it from the event
+        loop; use `get_status_async` instead.
+        """
+        return self._call_sync(self._get_status, full)
+
+    async def get_status_async(self, full=False):
+        """Get the status of the currently connected spectrograph, without
+        blocking the event loop.
+
+        See `get_status` for details.
+        """
+        return await self._call(self._get_status, full)
+
+    def refresh_static(self):
+        """Re-read the version strings and device configuration that
+        `get_status` caches, e.g. after the device has been reconfigured.
+
+        Raises
+        ------
+        AvsReturnError
+            Raised if there is an error querying the device.
+
+        Notes
+        -----
+        This blocks until libavs returns, so do not call it from the event
+        loop; use `refresh_static_async` instead.
+        """
+        self._call_sync(self._refresh_static)
+
+    async def refresh_static_async(self):
+        """Re-read the values that `get_status` caches, without blocking the
+        event loop.
+
+        See `refresh_static` for details.
         """
-        fpga_version = (ctypes.c_ubyte * 16)()
-        firmware_version = (ctypes.c_ubyte * 16)()
-        library_version = (ctypes.c_ubyte * 16)()
+        await self._call(self._refresh_static)
+
+    def _refresh_static(self):
+        """Implement `refresh_static` on the libavs thread."""
+        fpga_version = self._fpga_buf
+        firmware_version = self._firmware_buf
+        library_version = self._library_buf
+        # Clear the reused buffers, so that a shorter version string than the
+        # last one read is not followed by stale characters.
+        for buffer in (fpga_version, firmware_version, library_version):
+            ctypes.memset(buffer, 0, ctypes.sizeof(buffer))
         code = self.libavs.AVS_GetVersionInfo(
             self.handle, fpga_version, firmware_version, library_version
         )
         assert_avs_code(code, "GetVersionInfo")
 
-        config = AvsDeviceConfig()
+        # libavs rejects buffers smaller than the whole DeviceConfigType,
+        # so we always read the full structure, but into a reused buffer.
+        config = self._config_buf
+        self._uint_ptr.contents.value = DEVICE_CONFIG_SIZE
         code = self.libavs.AVS_GetParameter(
             self.handle,
-            ctypes.sizeof(config),
-            _getUIntPointer(ctypes.sizeof(config)),
+            DEVICE_CONFIG_SIZE,
+            self._uint_ptr,
             config,
         )
         assert_avs_code(code, "GetParameter")
 
-        voltage = _getFloatPointer()
-        code = self.libavs.AVS_GetAnalogIn(self.handle, 0, voltage)
-        assert_avs_code(code, "GetAnalogIn")
-        temperature = np.polynomial.polynomial.polyval(
-            voltage.contents.value, config.Temperature_3_m_aFit
+        self._temperature_fit = tuple(config.Temperature_3_m_aFit)
+        self._static_status = dict(
+            n_pixels=self._n_pixels,
+            fpga_version=_decode(fpga_version),
+            firmware_version=_decode(firmware_version),
+            library_version=_decode(library_version),
+            temperature_setpoint=config.TecControl_m_Setpoint,
         )
 
-        def decode(value):
-            """Return a byte string decoded to ASCII with NULLs stripped."""
-            return bytes(value).decode("ascii").split("\x00", 1)[0]
+    def _get_status(self, full):
+        """Implement `get_status` on the libavs thread."""
+        # Versions, pixel count, setpoint and thermistor fit do not change
+        # while the device is connected, so only the first (or a full)
+        # status request reads them from the device.
+        if full or self._static_status is None:
+            self._refresh_static()
+
+        voltage = self._float_ptr
+        code = self.libavs.AVS_GetAnalogIn(self.handle, 0, voltage)
+        assert_avs_code(code, "GetAnalogIn")
+        # Evaluate the degree-4 thermistor polynomial with Horner's method.
+        c0, c1, c2, c3, c4 = self._temperature_fit
+        v = voltage.contents.value
+        temperature = (((c4 * v + c3) * v + c2) * v + c1) * v + c0
 
         status = SpectrographStatus(
-            n_pixels=self._n_pixels,
-            fpga_version=decode(fpga_version),
-            firmware_version=decode(firmware_version),
-            library_version=decode(library_version),
-            temperature_setpoint=config.TecControl_m_Setpoint,
             temperature=temperature,
-            config=config if full else None,
+            # Return a copy, as the buffer is reused by the next call.
+            config=AvsDeviceConfig.from_buffer_copy(self._config_buf) if full else None,
+            **self._static_status,
         )
         return status
 
@@ -365,7 +559,7 @@ class AvsFiberSpectrograph:
         The ``Parameters`` of this method should match that of ``expose``, as
         its purpose is to check the validity of those parameters.
         """
-        if not self._expose_task.done():
+        if self._exposing():
             return "Cannot start new exposure until current exposure finishes."
 
         if (duration < MIN_DURATION) or (duration > MAX_DURATION):
@@ -430,52 +624,112 @@ class AvsFiberSpectrograph:
         asyncio.CancelledError
             Raised if the exposure is stopped before it is read out.
         asyncio.TimeoutError
-            Raised if polling for the exposure to be available for readout
-            does not complete within `self.pollscan_timeout` seconds.
+            Raised if the measurement is not available for readout within
+            `self.pollscan_timeout` seconds after the integration ends.
         """
-        config = AvsMeasureConfig()
+        # `expose` refuses to start while an exposure is running, but hold a
+        # lock as well, so that measurements on the one device handle are
+        # always taken one at a time and in order.
+        async with self._exposure_lock:
+            return await self._measure(duration)
+
+    async def _measure(self, duration):
+        """Prepare, take and read out one measurement; see `_do_expose`."""
+        if self._measuring:
+            # A previous measurement could not be stopped; stop it before
+            # replacing the callback that libavs may still call.
+            await self._stop_measurement()
+
+        config = AvsMeasureConfig.from_buffer_copy(self._measure_config_template)
         config.IntegrationTime = duration * 1000  # seconds->milliseconds
-        config.StartPixel = 0
-        config.StopPixel = self._n_pixels - 1
-        config.NrAverages = 1
         self.log.debug("Preparing %ss measurement.", duration)
-        code = self.libavs.AVS_PrepareMeasure(self.handle, config)
+        code = await self._call(self.libavs.AVS_PrepareMeasure, self.handle, config)
         assert_avs_code(code, "PrepareMeasure")
 
+        loop = asyncio.get_running_loop()
+        data_ready = loop.create_future()
+
+        def measure_callback(handle, result):
+            """Called by libavs (from its own thread) when the measurement
+            is available for readout.
+            """
+            code = result[0] if result else 0
+            # Exceptions cannot propagate out of a ctypes callback, and the
+            # loop may close at any time, so ignore a closed loop.
+            try:
+                loop.call_soon_threadsafe(
+                    lambda: data_ready.done() or data_ready.set_result(code)
+                )
+            except RuntimeError:
+                pass
+
+        # Hold a reference to the C callback for as long as libavs may call
+        # it; it would crash the process if it were garbage collected.
+        self._measure_callback = AvsMeasureCallback(measure_callback)
+
         self.log.info("Beginning %ss measurement.", duration)
-        code = self.libavs.AVS_Measure(self.handle, 0, 1)
+        code = await self._call(
+            self.libavs.AVS_Measure, self.handle, self._measure_callback, 1
+        )
         assert_avs_code(code, "Measure")
+        self._measuring = True
 
-        # get the wavelength range while we wait for the exposure.
-        wavelength = (ctypes.c_double * self._n_pixels)()
-        code = self.libavs.AVS_GetLambda(self.handle, wavelength)
-        assert_avs_code(code, "GetLambda")
-
-        measure_sleep = asyncio.create_task(asyncio.sleep(duration))
-        await measure_sleep
-
-        start_time = time.monotonic()
-        data_available = 0
-        while data_available != 1:
-            self.log.debug("Polling for measurement.")
-            data_available = self.libavs.AVS_PollScan(self.handle)
-            assert_avs_code(data_available, "PollScan")
-            if (time.monotonic() - start_time) > self.pollscan_timeout:
-                msg = "Timeout polling for exposure to be ready; waited {self.pollscan_timeout} seconds."
-                raise asyncio.TimeoutError(msg)
-            # Avantes docs say not to poll too rapidly, or it will overwhelm
-            # the spectrograph CPU. They suggest waiting at least 1ms;
-            # we'll wait 10ms so that we don't flood the logger.
-            await asyncio.sleep(0.01)
+        try:
+            # get the wavelength range while we wait for the exposure.
+            code = await self._call(
+                self.libavs.AVS_GetLambda, self.handle, self._wavelength_ptr
+            )
+            assert_avs_code(code, "GetLambda")
+
+            # Resolve the same future with None if the callback does not
+            # arrive in time, rather than wrapping it in `asyncio.wait_for`.
+            timer = loop.call_later(
+                duration + self.pollscan_timeout,
+                lambda: data_ready.done() or data_ready.set_result(None),
+            )
+            try:
+                code = await data_ready
+            finally:
+                timer.cancel()
+            if code is None:
+                # Fall back to polling once, in case the callback was missed.
+                self.log.debug("No measurement callback; polling for measurement.")
+                data_available = await self._call(self.libavs.AVS_PollScan, self.handle)
+                assert_avs_code(data_available, "PollScan")
+                if data_available != 1:
+                    msg = (
+                        "Timeout waiting for exposure to be ready; "
+                        f"waited {self.pollscan_timeout} seconds after integration."
+                    )
+                    raise asyncio.TimeoutError(msg)
+                code = 0
+        except BaseException:
+            # Do not leave libavs armed with a callback for a measurement
+            # that will never be read out.
+            if self._measuring:
+                try:
+                    await self._stop_measurement()
+                except Exception as e:
+                    self.log.error(
+                        "Could not stop abandoned measurement. %s: %s",
+                        type(e).__name__,
+                        e,
+                    )
+            raise
+        self._measuring = False
+        assert_avs_code(code, "Measure (callback)")
 
         self.log.debug("Reading measured data from spectrograph.")
-        time_label = (
-            _getUIntPointer()
-        )  # NOTE: it's not clear from the docs what this is for
-        spectrum = (ctypes.c_double * self._n_pixels)()
-        code = self.libavs.AVS_GetScopeData(self.handle, time_label, spectrum)
+        # NOTE: it's not clear from the docs what time_label is for
+        time_label = self._uint_ptr
+        code = await self._call(
+            self.libavs.AVS_GetScopeData, self.handle, time_label, self._spectrum_ptr
+        )
         assert_avs_code(code, "GetScopeData")
-        return np.array(wavelength) * u.nm, np.array(spectrum)
+        # Copy out of the reused arrays, which the next exposure overwrites.
+        wavelength = self._wavelength_buf.copy()
+        spectrum = self._spectrum_buf.copy()
+        return wavelength << u.nm, spectrum
 
     def stop_exposure(self):
         """Cancel a currently running exposure and reset the spectrograph.
@@ -486,65 +740,108 @@ class AvsFiberSpectrograph:
         ------
         AvsReturnError
             Raised if there is an error stopping the exposure on the device.
+
+        Notes
+        -----
+        This blocks until libavs returns, so do not call it from the event
+        loop; use `stop_exposure_async` instead.
         """
-        if not self._expose_task.done():
+        if self._exposing():
             # only cancel a running exposure
             self.log.info("Cancelling running exposure...")
-            code = self.libavs.AVS_StopMeasure(self.handle)
-            # cancel the async task before we handle any error codes
-            self._expose_task.cancel()
-            assert_avs_code(code, "StopMeasure")
+            code = self._call_sync(self.libavs.AVS_StopMeasure, self.handle)
+            self._cancel_exposure(code)
 
-    def __del__(self):
-        self.disconnect()
+    async def stop_exposure_async(self):
+        """Cancel a currently running exposure and reset the spectrograph,
+        without blocking the event loop.
 
-    def _configure_ctypes(self):
-        """Configure function arguments for communication with libavs.
+        See `stop_exposure` for details.
+        """
+        if self._exposing():
+            self.log.info("Cancelling running exposure...")
+            code = await self._call(self.libavs.AVS_StopMeasure, self.handle)
+            self._cancel_exposure(code)
+
+    def _exposing(self):
+        """Return True if an exposure is running."""
+        return self._expose_task is not None and not self._expose_task.done()
+
+    def _cancel_exposure(self, code):
+        """Cancel the exposure task after ``AVS_StopMeasure`` returned
+        ``code``.
 
-        Some of the functions in libavs need to have their types and/or
-        return values explicitly defined as pointers for python to be able
-        to pass them in correctly using the `ctypes` interface. Any C function
-        that manipulates a ctypes pointer should have its argument types
-        defined here.
+        Raises
+        ------
+        AvsReturnError
+            Raised if ``code`` is an error.
         """
-        self.libavs.AVS_GetList.argtypes = [
-            ctypes.c_long,
-            ctypes.POINTER(ctypes.c_uint),
-            ctypes.POINTER(AvsIdentity),
-        ]
-        self.libavs.AVS_Activate.argtypes = [ctypes.POINTER(AvsIdentity)]
-        self.libavs.AVS_GetNumPixels.argtypes = [
-            ctypes.c_long,
-            ctypes.POINTER(ctypes.c_ushort),
-        ]
-        self.libavs.AVS_GetParameter.argtypes = [
-            ctypes.c_long,
-            ctypes.c_uint,
-            ctypes.POINTER(ctypes.c_uint),
-            ctypes.POINTER(AvsDeviceConfig),
-        ]
-        self.libavs.AVS_GetVersionInfo.argtypes = [
-            ctypes.c_long,
-            ctypes.POINTER(ctypes.c_ubyte),
-            ctypes.POINTER(ctypes.c_ubyte),
-            ctypes.POINTER(ctypes.c_ubyte),
-        ]
-        self.libavs.AVS_GetAnalogIn.argtypes = [
-            ctypes.c_long,
-            ctypes.c_ubyte,
-            ctypes.POINTER(ctypes.c_float),
-        ]
-        self.libavs.AVS_PrepareMeasure.argtypes = [
-            ctypes.c_long,
-            ctypes.POINTER(AvsMeasureConfig),
-        ]
-        # Measure's second argument is the callback function pointer, but we
-        # aren't using callbacks here, so it will always be NULL==0.
-        self.libavs.AVS_Measure.argtypes = [ctypes.c_long, ctypes.c_int, ctypes.c_short]
-        self.libavs.AVS_GetLambda.argtypes = [
-            ctypes.c_long,
-            ctypes.POINTER(ctypes.c_double),
-        ]
+        if code >= 0:
+            self._measuring = False
+        # cancel the async task before we handle any error codes
+        self._expose_task.cancel()
+        assert_avs_code(code, "StopMeasure")
+
+    async def _stop_measurement(self):
+        """Stop the current measurement, so that libavs no longer calls its
+        callback.
+
+        Raises
+        ------
+        AvsReturnError
+            Raised if there is an error stopping the measurement.
+        """
+        code = await self._call(self.libavs.AVS_StopMeasure, self.handle)
+        assert_avs_code(code, "StopMeasure")
+        self._measuring = False
+
+    async def _call(self, function, *args):
+        """Call a libavs function on the libavs thread and await the result.
+
+        Parameters
+        ----------
+        function : `callable`
+            The libavs function to call.
+        *args
+            The arguments to pass to ``function``.
+
+        Returns
+        -------
+        result
+            The value returned by ``function``.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._ffi_executor, function, *args)
+
+    def _call_sync(self, function, *args):
+        """Call a function on the libavs thread and wait for the result.
+
+        If the libavs thread has been shut down (e.g. by `disconnect`),
+        call ``function`` directly.
+
+        Parameters
+        ----------
+        function : `callable`
+            The function to call.
+        *args
+            The arguments to pass to ``function``.
+
+        Returns
+        -------
+        result
+            The value returned by ``function``.
+        """
+        try:
+            future = self._ffi_executor.submit(function, *args)
+        except RuntimeError:
+            return function(*args)
+        return future.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disconnect()
 
 
 class FrozenMixin:
@@ -594,15 +891,67 @@ class AvsIdentity(ctypes.Structure, FrozenMixin):
     def __repr__(self):
         serial = self.SerialNumber.decode("ascii")
         name = self.UserFriendlyName.decode("ascii")
-        status = AvsDeviceStatus(struct.unpack("B", self.Status)[0])
+        status = AvsDeviceStatus(ord(self.Status))
         return f'AvsIdentity("{serial}", "{name}", {repr(status)})'
 
+    def _key(self):
+        # The char array fields read back NUL-truncated, so any stale bytes
+        # after the terminator do not take part in comparisons.
+        return (self.SerialNumber, self.UserFriendlyName, self.Status)
+
     def __eq__(self, other):
-        return (
-            self.SerialNumber == other.SerialNumber
-            and self.UserFriendlyName == other.UserFriendlyName
-            and self.Status == other.Status
-        )
+        if not isinstance(other, AvsIdentity):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+
+# Size in bytes of the AvsIdentityType C struct, from the Avantes manual.
+AVS_IDENTITY_SIZE = 75
+if ctypes.sizeof(AvsIdentity) != AVS_IDENTITY_SIZE:
+    raise RuntimeError(
+        f"AvsIdentity is {ctypes.sizeof(AvsIdentity)} bytes, "
+        f"but AvsIdentityType is {AVS_IDENTITY_SIZE} bytes."
+    )
+
+
+# numpy dtypes matching the ctypes field types in AvsDeviceConfig.
+_CTYPES_TO_NUMPY = {
+    ctypes.c_bool: np.bool_,
+    ctypes.c_float: np.float32,
+    ctypes.c_double: np.float64,
+    ctypes.c_int16: np.int16,
+    ctypes.c_uint8: np.uint8,
+    ctypes.c_uint16: np.uint16,
+    ctypes.c_uint32: np.uint32,
+}
+
+
+def _structured_dtype(fields):
+    """Return a packed numpy structured dtype mirroring ctypes ``_fields_``.
+
+    Parameters
+    ----------
+    fields : `list` [`tuple`]
+        The ``_fields_`` of a ``_pack_ = 1`` `ctypes.Structure`.
+
+    Returns
+    -------
+    dtype : `numpy.dtype`
+        Structured dtype with the same field names, offsets and itemsize.
+    """
+    descr = []
+    for name, ctype in fields:
+        if issubclass(ctype, ctypes.Array):
+            if ctype._type_ is ctypes.c_char:
+                descr.append((name, f"S{ctype._length_}"))
+            else:
+                descr.append((name, _CTYPES_TO_NUMPY[ctype._type_], (ctype._length_,)))
+        else:
+            descr.append((name, _CTYPES_TO_NUMPY[ctype]))
+    return np.dtype(descr)
 
 
 class AvsDeviceConfig(ctypes.Structure, FrozenMixin):
@@ -680,28 +1029,62 @@ class AvsDeviceConfig(ctypes.Structure, FrozenMixin):
         ("OemData", ctypes.c_uint8 * 4096),
     ]
 
+    # Large calibration and padding arrays that are left out of ``repr``;
+    # derived from ``_fields_`` so that the two cannot disagree.
+    _repr_skip = frozenset(
+        name for name, ctype in _fields_ if getattr(ctype, "_length_", 0) > 64
+    )
+
     def __repr__(self):
         def to_str(value):
             """Try to unroll ctype arrays."""
+            if isinstance(value, ctypes.Array):
+                dtype = _CTYPES_TO_NUMPY.get(value._type_)
+                if dtype is not None:
+                    return str(np.frombuffer(value, dtype=dtype).tolist())
             try:
                 return str([x for x in value])
             except TypeError:
                 return str(value)
 
-        too_long = [
-            "Irradiance_m_IntensityCalib_m_aCalibConvers",
-            "Reflectance_m_aCalibConvers",
-            "SpectrumCorrect",
-            "Reserved",
-            "OemData",
-        ]
         attrs = ", ".join(
-            f"{x[0]}={to_str(getattr(self, x[0]))}"
-            for x in self._fields_
-            if x[0] not in too_long
+            f"{name}={to_str(getattr(self, name))}"
+            for name, _ in self._fields_
+            if name not in self._repr_skip
         )
         return f"AvsDeviceConfig({attrs})"
 
+    def as_record(self):
+        """Return a numpy record viewing this structure's memory.
+
+        No data is copied: the record shares memory with this structure,
+        so array fields such as ``SpectrumCorrect`` are numpy arrays that
+        can be used directly.
+
+        Returns
+        -------
+        record : `numpy.void`
+            Record with dtype `DEVICE_CONFIG_DTYPE`.
+        """
+        return np.frombuffer(self, dtype=DEVICE_CONFIG_DTYPE, count=1)[0]
+
+
+# Size in bytes of the DeviceConfigType C struct, from the Avantes manual.
+DEVICE_CONFIG_SIZE = 63484
+if ctypes.sizeof(AvsDeviceConfig) != DEVICE_CONFIG_SIZE:
+    raise RuntimeError(
+        f"AvsDeviceConfig is {ctypes.sizeof(AvsDeviceConfig)} bytes, "
+        f"but DeviceConfigType is {DEVICE_CONFIG_SIZE} bytes."
+    )
+
+# numpy view of AvsDeviceConfig, for bulk access to its fields.
+DEVICE_CONFIG_DTYPE = _structured_dtype(AvsDeviceConfig._fields_)
+if DEVICE_CONFIG_DTYPE.itemsize != DEVICE_CONFIG_SIZE:
+    raise RuntimeError(
+        f"DEVICE_CONFIG_DTYPE is {DEVICE_CONFIG_DTYPE.itemsize} bytes, "
+        f"but DeviceConfigType is {DEVICE_CONFIG_SIZE} bytes."
+    )
+
 
 class AvsMeasureConfig(ctypes.Structure, FrozenMixin):
     _pack_ = 1
@@ -788,6 +1171,11 @@ class AvsReturnCode(enum.IntEnum):
     invalidHandle = 1000
 
 
+# Map of integer value to `AvsReturnCode`, for lookups that do not go
+# through the enum's value validation.
+_AVS_RETURN_CODES = {code.value: code for code in AvsReturnCode}
+
+
 @dataclasses.dataclass
 class SpectrographStatus:
     """The current status of the connected spectrograph."""
@@ -808,21 +1196,206 @@ class SpectrographStatus:
     """The full AvsDeviceConfig structure."""
 
 
-def _getUIntPointer(value=0):
-    """Return a pointer to a ctypes unsigned int."""
-    return ctypes.POINTER(ctypes.c_uint)(ctypes.c_uint(value))
+# The libavs library that new `AvsFiberSpectrograph` instances use; loaded
+# on first use, and dropped by `_unload_libavs`.
+_LIBAVS = {"lib": None}
+# The number of instances using each loaded library. This is keyed on the
+# library, so that instances still holding a library that was unloaded
+# keep sharing it.
+_LIBAVS_USERS = {}
+# Reentrant, since a garbage collected `AvsFiberSpectrograph`'s finalizer
+# may release the library while the lock is held.
+_LIBAVS_LOCK = threading.RLock()
+
+
+def _acquire_libavs():
+    """Return the shared libavs library, initializing the USB library if no
+    other instance is using it.
+
+    The library is loaded and configured on first use.
+
+    Returns
+    -------
+    libavs : `ctypes.CDLL`
+        The loaded and configured libavs library.
+    """
+    with _LIBAVS_LOCK:
+        libavs = _LIBAVS["lib"]
+        if libavs is None:
+            libavs = ctypes.CDLL(LIBRARY_PATH)
+            _configure_ctypes(libavs)
+            _LIBAVS["lib"] = libavs
+        users = _LIBAVS_USERS.get(libavs, 0)
+        if users == 0:
+            # NOTE: AVS_Init(0) initializes the USB library, not device 0.
+            libavs.AVS_Init(0)
+        _LIBAVS_USERS[libavs] = users + 1
+        return libavs
+
+
+def _release_libavs(libavs):
+    """Release a library returned by `_acquire_libavs`, closing the USB
+    library once no instance is using it.
+
+    Parameters
+    ----------
+    libavs : `ctypes.CDLL`
+        The library to release.
+    """
+    with _LIBAVS_LOCK:
+        users = _LIBAVS_USERS.pop(libavs, 0) - 1
+        if users > 0:
+            _LIBAVS_USERS[libavs] = users
+            return
+        libavs.AVS_Done()
+
+
+def _unload_libavs():
+    """Make the next `_acquire_libavs` load the library again.
 
+    Instances that already hold the current library keep using it. This is
+    for `AvsSimulator`, which replaces the library by patching
+    ``ctypes.CDLL``.
+    """
+    with _LIBAVS_LOCK:
+        _LIBAVS["lib"] = None
+
+
+# Return and argument types of every libavs function that we call, declared
+# once (in the manner of a C header) and attached to the library when it is
+# loaded, so that ctypes converts arguments and results against a fixed
+# prototype instead of guessing the C type of each Python argument on every
+# call. Device handles are C ``long``.
+_LIBAVS_PROTOTYPES = {
+    "AVS_Init": (ctypes.c_int, [ctypes.c_short]),
+    "AVS_Done": (ctypes.c_int, []),
+    "AVS_UpdateUSBDevices": (ctypes.c_int, []),
+    "AVS_GetList": (
+        ctypes.c_int,
+        [ctypes.c_uint, ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(AvsIdentity)],
+    ),
+    "AVS_Activate": (ctypes.c_long, [ctypes.POINTER(AvsIdentity)]),
+    "AVS_Deactivate": (ctypes.c_bool, [ctypes.c_long]),
+    "AVS_GetNumPixels": (
+        ctypes.c_int,
+        [ctypes.c_long, ctypes.POINTER(ctypes.c_ushort)],
+    ),
+    "AVS_GetParameter": (
+        ctypes.c_int,
+        [
+            ctypes.c_long,
+            ctypes.c_uint,
+            ctypes.POINTER(ctypes.c_uint),
+            ctypes.POINTER(AvsDeviceConfig),
+        ],
+    ),
+    "AVS_GetVersionInfo": (
+        ctypes.c_int,
+        [
+            ctypes.c_long,
+            ctypes.POINTER(ctypes.c_ubyte),
+            ctypes.POINTER(ctypes.c_ubyte),
+            ctypes.POINTER(ctypes.c_ubyte),
+        ],
+    ),
+    "AVS_GetAnalogIn": (
+        ctypes.c_int,
+        [ctypes.c_long, ctypes.c_ubyte, ctypes.POINTER(ctypes.c_float)],
+    ),
+    "AVS_PrepareMeasure": (
+        ctypes.c_int,
+        [ctypes.c_long, ctypes.POINTER(AvsMeasureConfig)],
+    ),
+    # Measure's second argument is the callback function pointer that
+    # libavs calls when the measurement is ready for readout.
+    "AVS_Measure": (
+        ctypes.c_int,
+        [ctypes.c_long, AvsMeasureCallback, ctypes.c_short],
+    ),
+    "AVS_PollScan": (ctypes.c_int, [ctypes.c_long]),
+    "AVS_StopMeasure": (ctypes.c_int, [ctypes.c_long]),
+    "AVS_GetLambda": (
+        ctypes.c_int,
+        [ctypes.c_long, ctypes.POINTER(ctypes.c_double)],
+    ),
+    "AVS_GetScopeData": (
+        ctypes.c_int,
+        [
+            ctypes.c_long,
+            ctypes.POINTER(ctypes.c_uint),
+            ctypes.POINTER(ctypes.c_double),
+        ],
+    ),
+}
 
-def _getUShortPointer(value=0):
-    """Return a pointer to a ctypes unsigned short."""
-    return ctypes.POINTER(ctypes.c_ushort)(ctypes.c_ushort(value))
 
+def _configure_ctypes(libavs):
+    """Configure function arguments for communication with libavs.
 
-def _getFloatPointer(value=0):
-    """Return a pointer to a ctypes 32-bit float."""
-    return ctypes.POINTER(ctypes.c_float)(ctypes.c_float(value))
+    Applies the prototypes in ``_LIBAVS_PROTOTYPES`` to the loaded library.
+    This is done once per library object (see `_acquire_libavs`), not once
+    per device or per call.
+
+    Parameters
+    ----------
+    libavs : `ctypes.CDLL`
+        The loaded libavs library.
+    """
+    for name, (restype, argtypes) in _LIBAVS_PROTOTYPES.items():
+        function = getattr(libavs, name)
+        function.restype = restype
+        function.argtypes = argtypes
+
+
+def _close_device(libavs, handle, log):
+    """Deactivate a device and release libavs, for an `AvsFiberSpectrograph`
+    that was garbage collected without calling ``disconnect``.
+
+    Parameters
+    ----------
+    libavs : `ctypes.CDLL`
+        The library returned by `_acquire_libavs`.
+    handle : `int`
+        The handle of the connected device.
+    log : `logging.Logger`
+        Logger for error messages.
+    """
+    try:
+        if not libavs.AVS_Deactivate(handle):
+            log.error("Could not deactivate device with handle %s.", handle)
+    except Exception as e:
+        log.error("Error deactivating device. %s: %s", type(e).__name__, e)
+    finally:
+        _release_libavs(libavs)
+
+
+def _aligned_buffer(size, alignment=64):
+    """Return a zeroed float64 array whose data is cache-line aligned.
+
+    The array is filled explicitly (rather than with `numpy.zeros`, which may
+    map untouched zero pages) so that its pages are faulted in now, not
+    during the first exposure.
+
+    Parameters
+    ----------
+    size : `int`
+        Number of elements in the array.
+    alignment : `int`, optional
+        Required alignment of the data, in bytes.
+
+    Returns
+    -------
+    buffer : `numpy.ndarray`
+        The aligned, zero-filled array.
+    """
+    itemsize = np.dtype(np.float64).itemsize
+    raw = np.empty(size + alignment // itemsize, dtype=np.float64)
+    offset = (-raw.ctypes.data % alignment) // itemsize
+    buffer = raw[offset : offset + size]
+    buffer.fill(0.0)
+    return buffer
 
 
-def _getAvsIdentityArrayPointer(count):
-    """Return a pointer to an arry of `AvsIdentity`."""
-    return (AvsIdentity * count)()
+def _decode(value):
+    """Return a byte string decoded to ASCII with NULLs stripped."""
+    return ctypes.string_at(value, len(value)).split(b"\x00", 1)[0].decode("ascii")
@@ -25,12 +25,22 @@ in both tests and as an instrument simulator for a CSC.
 
 __all__ = ["AvsSimulator"]
 
+import ctypes
+import threading
 import unittest.mock
 
 import numpy as np
 
 from . import constants
-from .avs_fiber_spectrograph import AvsDeviceStatus, AvsIdentity
+from .avs_fiber_spectrograph import AvsDeviceStatus, AvsIdentity, _unload_libavs
+
+# The simulated readout is the same for every simulator, so build it once,
+# read-only, and share it between instances.
+_N_PIXELS = 2048
+_WAVELENGTH = np.arange(_N_PIXELS, dtype=np.float64)
+_WAVELENGTH.setflags(write=False)
+_SPECTRUM = _WAVELENGTH * 2
+_SPECTRUM.setflags(write=False)
 
 
 class AvsSimulator:
@@ -42,16 +52,32 @@ class AvsSimulator:
     with all methods behaving as if one device is connected and behaving.
     """
 
+    # Pretend one device is connected: the red spectrograph
+    n_devices = 1
+    handle = 314159
+
+    # The parts of the mock configuration that do not depend on the instance.
+    _STATIC_CONFIG = {
+        # successful init() and updateUSBDevices() return the number of devices
+        "return_value.AVS_Init.return_value": n_devices,
+        "return_value.AVS_UpdateUSBDevices.return_value": n_devices,
+        # successful activate() returns the handle of the connected device
+        "return_value.AVS_Activate.return_value": handle,
+        # successful disconnect() returns True
+        "return_value.AVS_Deactivate.return_value": True,
+        "return_value.AVS_Measure.return_value": 0,
+        # Polling is only a fallback for a missed callback; data is ready.
+        "return_value.AVS_PollScan.return_value": 1,
+        "return_value.AVS_StopMeasure.return_value": 0,
+    }
+
     def __init__(self):
         self.mock = None
 
         # This will be passed into the patcher to configure the mock.
-        config = dict()
+        config = dict(self._STATIC_CONFIG)
 
-        # Pretend one device is connected: the red spectrograph
-        self.n_devices = 1
         self.serial_number = constants.SERIAL_NUMBERS[constants.SalIndex.RED]
-        self.handle = 314159
 
         name = b"Fake Spectrograph"
         status = AvsDeviceStatus.USB_AVAILABLE.value
@@ -67,14 +93,15 @@ class AvsSimulator:
 
         # Have the number of pixels, and temperature values match the real
         # device, so that users aren't confused by simulation telemetry.
-        self.n_pixels = 2048
+        self.n_pixels = _N_PIXELS
         self.temperature_setpoint = 5
         # thermistor voltage is converted to temperature via a polynomial:
         # these coefficients should result in a temperature of 5.0
         self.tec_coefficients = np.array((1, 2, 0, 0.0, 0), dtype=np.float32)
         self.tec_voltage = 2
-        self.temperature = sum(
-            coeff * self.tec_voltage**i for i, coeff in enumerate(self.tec_coefficients)
+        # np.polyval wants the highest-order coefficient first.
+        self.temperature = float(
+            np.polyval(self.tec_coefficients[::-1], self.tec_voltage)
         )
 
         def mock_getParameter(handle, a_Size, a_pRequiredSize, config):
@@ -112,24 +139,17 @@ class AvsSimulator:
             a_pNumPixels.contents.value = self.n_pixels
             return 0
 
-        self.wavelength = np.arange(0, self.n_pixels)
+        self.wavelength = _WAVELENGTH
         config["return_value.AVS_GetNumPixels.side_effect"] = mock_getNumPixels
 
         def mock_getLambda(handle, a_pWavelength):
-            a_pWavelength[:] = self.wavelength
+            np.ctypeslib.as_array(a_pWavelength, shape=(self.n_pixels,))[:] = (
+                self.wavelength
+            )
             return 0
 
         config["return_value.AVS_GetLambda.side_effect"] = mock_getLambda
 
-        # successful init() and updateUSBDevices() return the number of devices
-        config["return_value.AVS_Init.return_value"] = self.n_devices
-        config["return_value.AVS_UpdateUSBDevices.return_value"] = self.n_devices
-
-        # successful activate() returns the handle of the connected device
-        config["return_value.AVS_Activate.return_value"] = self.handle
-        # successful disconnect() returns True
-        config["return_value.AVS_Deactivate.return_value"] = True
-
         self.measure_config_sent = None
 
         def mock_prepareMeasure(handle, a_pMeasConfig):
@@ -139,22 +159,46 @@ class AvsSimulator:
 
         config["return_value.AVS_PrepareMeasure.side_effect"] = mock_prepareMeasure
 
-        # Measure doesn't have any obvious effects.
-        config["return_value.AVS_Measure.return_value"] = 0
-
-        # Require four polls of the device before a measurement is ready
-        config["return_value.AVS_PollScan.side_effect"] = [0, 0, 0, 1]
-
-        self.spectrum = np.arange(0, self.n_pixels) * 2
+        # The result passed to the measurement callback; negative values
+        # are AvsReturnCode errors.
+        self.measure_result = 0
+        self._measure_timer = None
+
+        def mock_measure(handle, a_Callback, a_Nmsr):
+            """Call the measurement callback from another thread once the
+            integration time has elapsed, as libavs does.
+            """
+            if a_Callback:
+                duration = self.measure_config_sent.IntegrationTime / 1000
+                self._measure_timer = threading.Timer(
+                    duration,
+                    a_Callback,
+                    args=(
+                        ctypes.pointer(ctypes.c_long(handle)),
+                        ctypes.pointer(ctypes.c_int(self.measure_result)),
+                    ),
+                )
+                self._measure_timer.start()
+            return unittest.mock.DEFAULT
+
+        config["return_value.AVS_Measure.side_effect"] = mock_measure
+
+        self.spectrum = _SPECTRUM
 
         def mock_getScopeData(handle, a_pTimeLabel, a_pSpectrum):
-            a_pSpectrum[:] = self.spectrum
+            np.ctypeslib.as_array(a_pSpectrum, shape=(self.n_pixels,))[:] = (
+                self.spectrum
+            )
             return 0
 
         config["return_value.AVS_GetScopeData.side_effect"] = mock_getScopeData
 
-        # StopMeasure doesn't have any obvious effects.
-        config["return_value.AVS_StopMeasure.return_value"] = 0
+        def mock_stopMeasure(handle):
+            """Stop any pending measurement callback."""
+            self._cancel_measure_timer()
+            return unittest.mock.DEFAULT
+
+        config["return_value.AVS_StopMeasure.side_effect"] = mock_stopMeasure
 
         self.patcher = unittest.mock.patch("ctypes.CDLL", **config)
 
@@ -175,6 +219,8 @@ class AvsSimulator:
         """
         if self.mock is None:
             self.mock = self.patcher.start()
+            # Load the patched library for the next connection.
+            _unload_libavs()
 
         if testCase is not None:
             testCase.addCleanup(self.stop)
@@ -188,4 +234,12 @@ class AvsSimulator:
         # Note, this is fixed in py3.8: https://bugs.python.org/issue36366
         if self.mock is not None:
             self.patcher.stop()
+            _unload_libavs()
         self.mock = None
+        self._cancel_measure_timer()
+
+    def _cancel_measure_timer(self):
+        """Cancel the pending measurement callback, if any."""
+        if self._measure_timer is not None:
+            self._measure_timer.cancel()
+            self._measure_timer = None
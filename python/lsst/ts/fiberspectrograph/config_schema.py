@@ -21,32 +21,44 @@
 
 __all__ = ["CONFIG_SCHEMA"]
 
-import yaml
-
-CONFIG_SCHEMA = yaml.safe_load(
-    """
-$schema: http://json-schema.org/draft-07/schema#
-$id: https://github.com/lsst-ts/ts_FiberSpectrograph/blob/master/python/lsst/ts/FiberSpectrograph/schema_config.py  # noqa
-# title must end with one or more spaces followed by the schema version, which must begin with "v"
-title: FiberSpectrograph v4
-description: Schema for FiberSpectrograph configuration files
-type: object
-properties:
-  s3instance:
-    description: >-
-      Large File Annex S3 instance, for example "cp", "tuc" or  "ls".
-    type: string
-    pattern: "^[a-z0-9][.a-z0-9]*[a-z0-9]$"
-  image_service_url:
-    description: The Image service host.
-    type: string
-  location:
-    description: Physical placement of the fiebr spectrograph (e.g. AuxTel Calibration Cabinet or Laser Room).
-    type: string
-required:
-  - s3instance
-  - image_service_url
-  - location
-additionalProperties: false
-"""
-)
+CONFIG_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "$id": "https://github.com/lsst-ts/ts_FiberSpectrograph/blob/master/python/lsst/ts/FiberSpectrograph/schema_config.py",  # noqa
+    # title must end with one or more spaces followed by the schema version,
+    # which must begin with "v"
+    "title": "FiberSpectrograph v4",
+    "description": "Schema for FiberSpectrograph configuration files",
+    "type": "object",
+    "properties": {
+        "s3instance": {
+            "description": 'Large File Annex S3 instance, for example "cp", "tuc" or  "ls".',
+            "type": "string",
+            "pattern": "^[a-z0-9][.a-z0-9]*[a-z0-9]$",
+        },
+        "image_service_url": {
+            "description": "The Image service host.",
+            "type": "string",
+        },
+        "telemetry_interval": {
+            "description": "Interval between temperature telemetry outputs (seconds).",
+            "type": "number",
+            "exclusiveMinimum": 0,
+            "default": 10,
+        },
+        "upload_stop_timeout": {
+            "description": "Maximum time to wait for exposures that are still queued "
+            "to be saved when leaving the DISABLED and ENABLED states (seconds); "
+            "any exposure not saved by then is discarded, with a warning.",
+            "type": "number",
+            "minimum": 0,
+            "default": 5,
+        },
+        "location": {
+            "description": "Physical placement of the fiebr spectrograph "
+            "(e.g. AuxTel Calibration Cabinet or Laser Room).",
+            "type": "string",
+        },
+    },
+    "required": ["s3instance", "image_service_url", "location"],
+    "additionalProperties": False,
+}
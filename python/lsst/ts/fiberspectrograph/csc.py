@@ -25,7 +25,6 @@ import asyncio
 import io
 import pathlib
 
-import astropy.units as u
 from lsst.ts import salobj, utils
 from lsst.ts.idl.enums.FiberSpectrograph import ExposureState
 
@@ -70,6 +69,9 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
 
     * 1: If there is an error connecting to the spectrograph.
     * 20: If there is an error taking an exposure.
+    * 21: If an exposure could not be saved, either to S3 or locally.
+      Exposures are saved in the background after the ``expose`` command
+      has succeeded, so this is the only report of a failed save.
     """
 
     valid_simulation_modes = (0, 1, 2, 3)
@@ -91,6 +93,8 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
         index = constants.SalIndex(index)
         self._simulator = None
         self.device = None
+        # Status of the device when it was connected, for ``deviceInfo``.
+        self._device_info = None
 
         self.serial_number = constants.SERIAL_NUMBERS[index]
         # Short name of instrument
@@ -98,6 +102,7 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
         self.generator_name = f"fiberSpec{self.band_name}"
         self.s3bucket_name = None  # Set by `configure`.
         self.s3bucket = None  # Set by `handle_summary_state`.
+        self._s3_url_prefix = None  # Set with `s3bucket`.
 
         self.data_manager = data_manager.DataManager(
             instrument=f"FiberSpectrograph.{self.band_name}",
@@ -105,7 +110,18 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
             serial=self.serial_number,
         )
         self.telemetry_loop_task = utils.make_done_future()
-        self.telemetry_interval = 10  # seconds between telemetry output
+        # Exposures waiting to be saved by `upload_loop`.
+        self._upload_queue = asyncio.Queue(maxsize=10)
+        self.upload_task = utils.make_done_future()
+        # Seconds between telemetry output; set by `configure`.
+        self.telemetry_interval = 10
+        # Maximum time to wait for an S3 upload before saving locally instead.
+        self.s3_upload_timeout = 30  # seconds
+        # Maximum time to wait for the image name service to return an obsid.
+        self.image_service_timeout = 10  # seconds
+        # Maximum time to wait for queued exposures to be saved when leaving
+        # the DISABLED and ENABLED states; set by `configure`.
+        self.upload_stop_timeout = 5  # seconds
 
         super().__init__(
             name="FiberSpectrograph",
@@ -127,6 +143,8 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
             s3instance=config.s3instance,
         )
         self.config = config
+        self.telemetry_interval = config.telemetry_interval
+        self.upload_stop_timeout = config.upload_stop_timeout
         self.image_service_client = utils.ImageNameServiceClient(
             config.image_service_url, self.salinfo.index, "FiberSpectrograph"
         )
@@ -139,19 +157,31 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
                 self.s3bucket = salobj.AsyncS3Bucket(
                     name=self.s3bucket_name, domock=domock, create=domock
                 )
+                endpoint_url = (
+                    self.s3bucket.service_resource.meta.client.meta.endpoint_url
+                )
+                self._s3_url_prefix = f"{endpoint_url}/{self.s3bucket.name}/"
             if self.device is None:
                 try:
-                    self.device = AvsFiberSpectrograph(
-                        serial_number=self.serial_number, log=self.log
+                    # Connecting calls libavs, which blocks; keep it off the
+                    # event loop.
+                    self.device = await asyncio.to_thread(
+                        AvsFiberSpectrograph,
+                        serial_number=self.serial_number,
+                        log=self.log,
                     )
                 except Exception as e:
                     msg = "Failed to connect to fiber spectrograph."
                     await self.fault(code=1, report=f"{msg}: {repr(e)}")
                     raise salobj.ExpectedError(msg)
+                # The device info does not change while we are connected.
+                self._device_info = await self.device.get_status_async()
 
             if self.telemetry_loop_task.done():
                 self.telemetry_loop_task = asyncio.create_task(self.telemetry_loop())
-            status = self.device.get_status()
+            if self.upload_task.done():
+                self.upload_task = asyncio.create_task(self.upload_loop())
+            status = self._device_info
             await self.evt_deviceInfo.set_write(
                 npixels=status.n_pixels,
                 fpgaVersion=status.fpga_version,
@@ -160,20 +190,26 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
             )
         else:
             self.telemetry_loop_task.cancel()
+            # Save any exposures already taken before closing the bucket.
+            await self._stop_uploads()
             if self.device is not None:
-                self.device.disconnect()
+                await self.device.disconnect_async()
             self.device = None
+            self._device_info = None
             if self.s3bucket is not None:
                 self.s3bucket.stop_mock()
             self.s3bucket = None
+            self._s3_url_prefix = None
 
     async def close_tasks(self):
-        """Kill the telemetry loop if we are closed outside of OFFLINE.
+        """Kill the telemetry and upload loops if we are closed outside of
+        OFFLINE.
 
         This keeps tests from emitting warnings about a pending task.
         """
         await super().close_tasks()
         self.telemetry_loop_task.cancel()
+        await self._stop_uploads()
         if self._simulator is not None:
             self._simulator.stop()
 
@@ -181,13 +217,77 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
         """Output telemetry information at regular intervals.
 
         The primary telemetry from the fiber spectrograph is the temperature.
+        Output is scheduled against fixed deadlines, so the time spent
+        reading and writing the telemetry does not accumulate as drift.
         """
+        loop = asyncio.get_running_loop()
+        get_status = self.device.get_status_async
+        deadline = loop.time()
         while True:
-            status = self.device.get_status()
+            status = await get_status()
             await self.tel_temperature.set_write(
                 temperature=status.temperature, setpoint=status.temperature_setpoint
             )
-            await asyncio.sleep(self.telemetry_interval)
+            # If we fell behind, start again a full interval from now
+            # instead of catching up.
+            now = loop.time()
+            deadline += self.telemetry_interval
+            if deadline < now:
+                deadline = now + self.telemetry_interval
+            await asyncio.sleep(deadline - now)
+
+    async def upload_loop(self):
+        """Save queued exposures, in the order they were taken.
+
+        This runs in the background, so that `do_expose` can finish as soon
+        as an exposure has been read out.
+        If an exposure cannot be saved, go to FAULT and stop;
+        going to FAULT discards any exposures still in the queue.
+        """
+        while True:
+            spec_data = await self._upload_queue.get()
+            try:
+                await self.save_data(spec_data)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            finally:
+                self._upload_queue.task_done()
+            if error is not None:
+                await self.fault(
+                    code=21, report=f"Failed to save exposure data: {repr(error)}"
+                )
+                return
+
+    async def _stop_uploads(self):
+        """Wait for queued exposures to be saved, then stop `upload_loop`.
+
+        Wait at most ``upload_stop_timeout`` seconds, and log a warning
+        about every exposure that was not saved.
+        If called from `upload_loop` itself (because it went to FAULT),
+        discard the queue without waiting.
+        """
+        if (
+            not self.upload_task.done()
+            and self.upload_task is not asyncio.current_task()
+        ):
+            try:
+                await asyncio.wait_for(
+                    self._upload_queue.join(), timeout=self.upload_stop_timeout
+                )
+            except asyncio.TimeoutError:
+                self.log.warning(
+                    "Timed out waiting for exposures to be saved; "
+                    "the exposure being saved is lost."
+                )
+            self.upload_task.cancel()
+        while not self._upload_queue.empty():
+            spec_data = self._upload_queue.get_nowait()
+            self._upload_queue.task_done()
+            self.log.warning(
+                "Discarding unsaved exposure taken at %s.", spec_data.date_begin.isot
+            )
 
     async def implement_simulation_mode(self, simulation_mode):
         if simulation_mode & constants.SimulationMode.Spectrograph != 0:
@@ -197,6 +297,12 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
     async def do_expose(self, data):
         """Take an exposure with the connected spectrograph.
 
+        The command succeeds once the exposure has been read out and queued
+        to be saved; it does not wait for the FITS file to be saved.
+        `upload_loop` saves it in the background and announces it with
+        ``largeFileObjectAvailable``; if it cannot be saved, the CSC goes to
+        FAULT with error code 21.
+
         Parameters
         ----------
         data : `DataType`
@@ -214,21 +320,23 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
         if msg is not None:
             raise salobj.ExpectedError(msg)
         try:
-            date_begin = utils.astropy_time_from_tai_unix(utils.current_tai())
+            # Record raw TAI timestamps around the exposure; converting them
+            # to astropy Time can wait until the exposure is finished.
+            tai_begin = utils.current_tai()
             task = asyncio.create_task(self.device.expose(data.duration))
             await self.evt_exposureState.set_write(status=ExposureState.INTEGRATING)
             wavelength, spectrum = await task
-            date_end = utils.astropy_time_from_tai_unix(utils.current_tai())
+            tai_end = utils.current_tai()
             await self.evt_exposureState.set_write(status=ExposureState.DONE)
-            temperature = self.tel_temperature.data.temperature * u.deg_C
-            setpoint = self.tel_temperature.data.setpoint * u.deg_C
+            temperature = self.tel_temperature.data.temperature
+            setpoint = self.tel_temperature.data.setpoint
             n_pixels = self.evt_deviceInfo.data.npixels
             spec_data = data_manager.SpectrographData(
                 wavelength=wavelength,
                 spectrum=spectrum,
                 duration=data.duration,
-                date_begin=date_begin,
-                date_end=date_end,
+                date_begin=utils.astropy_time_from_tai_unix(tai_begin),
+                date_end=utils.astropy_time_from_tai_unix(tai_end),
                 type=data.type,
                 source=data.source,
                 temperature=temperature,
@@ -249,25 +357,38 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
             await self.fault(code=20, report=msg)
             raise salobj.ExpectedError(msg)
 
-        await self.save_data(spec_data)
+        # Only waits if too many exposures are already waiting to be saved.
+        await self._upload_queue.put(spec_data)
 
     async def save_data(self, spec_data):
         """Save a spectrograph FITS file to the LFA, if possible.
 
-        If the S3 upload fails then try to save the file locally to /tmp.
+        If the S3 upload fails or does not finish within
+        ``s3_upload_timeout`` seconds then try to save the file locally
+        to /tmp.
         The ``largeFileObjectAvailable`` event is written only if S3
         upload succeeds.
+
+        Raises
+        ------
+        asyncio.TimeoutError
+            Raised if the image name service does not return an obsid
+            within ``image_service_timeout`` seconds.
+        Exception
+            Raised if the file could not be saved to S3 or locally.
         """
         hdulist = self.data_manager.make_hdulist(spec_data)
-        image_sequence_array, data = await self.image_service_client.get_next_obs_id(
-            num_images=1
+        image_sequence_array, data = await asyncio.wait_for(
+            self.image_service_client.get_next_obs_id(num_images=1),
+            timeout=self.image_service_timeout,
         )
         hdulist[0].header["OBSID"] = data[0]
         hdulist[0].header["TELCODE"] = self.config.location
         hdulist[0].header["SEQNUM"] = int(image_sequence_array[0])
         hdulist[0].header["CONTRLLR"] = data[0].split("_")[0]
+        # Serializing the FITS file blocks, so do it in a worker thread.
         fileobj = io.BytesIO()
-        hdulist.writeto(fileobj)
+        await asyncio.to_thread(hdulist.writeto, fileobj)
         fileobj.seek(0)
         date_begin = spec_data.date_begin
         key = self.s3bucket.make_key(
@@ -278,8 +399,11 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
             suffix=".fits",
         )
         try:
-            await self.s3bucket.upload(fileobj=fileobj, key=key)
-            url = f"{self.s3bucket.service_resource.meta.client.meta.endpoint_url}/{self.s3bucket.name}/{key}"
+            await asyncio.wait_for(
+                self.s3bucket.upload(fileobj=fileobj, key=key),
+                timeout=self.s3_upload_timeout,
+            )
+            url = self._s3_url_prefix + key
             await self.evt_largeFileObjectAvailable.set_write(
                 url=url, generator=self.generator_name
             )
@@ -287,22 +411,34 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
             self.log.exception(
                 f"Could not upload FITS file {key} to S3; trying to save to local disk."
             )
-            try:
-                filepath = pathlib.Path("/tmp") / self.s3bucket.name / key
-                dirpath = filepath.parent
-                if not dirpath.exists():
-                    self.log.info(f"Create {str(dirpath)}")
-                    dirpath.mkdir(parents=True, exist_ok=True)
-
-                hdulist.writeto(filepath)
-                await self.evt_largeFileObjectAvailable.set_write(
-                    url=filepath.as_uri(), generator=self.generator_name
-                )
-            except Exception:
-                self.log.exception(
-                    "Could not save the FITS file locally, either. The data is lost."
-                )
-                raise
+            # If this fails too, `upload_loop` reports it by going to FAULT.
+            filepath = pathlib.Path("/tmp") / self.s3bucket.name / key
+            await asyncio.to_thread(self._write_local, fileobj, filepath)
+            await self.evt_largeFileObjectAvailable.set_write(
+                url=filepath.as_uri(), generator=self.generator_name
+            )
+
+    def _write_local(self, fileobj, filepath):
+        """Write a serialized FITS file to local disk, creating its directory
+        if needed.
+
+        This blocks, so call it from a worker thread.
+
+        Parameters
+        ----------
+        fileobj : `io.BytesIO`
+            The serialized FITS file. Its contents are written without
+            using or moving its file position, which a timed-out S3 upload
+            may still be using.
+        filepath : `pathlib.Path`
+            The file to write; it must not already exist.
+        """
+        dirpath = filepath.parent
+        if not dirpath.exists():
+            self.log.info(f"Create {str(dirpath)}")
+            dirpath.mkdir(parents=True, exist_ok=True)
+        with fileobj.getbuffer() as buffer, open(filepath, "xb") as f:
+            f.write(buffer)
 
     async def do_cancelExposure(self, data):
         """Cancel an ongoing exposure.
@@ -313,7 +449,7 @@ class FiberSpectrographCsc(salobj.ConfigurableCsc):
             Command data
         """
         self.assert_enabled()
-        self.device.stop_exposure()
+        await self.device.stop_exposure_async()
 
 
 def run_fiberspectrograph():
@@ -24,16 +24,15 @@ __all__ = ["SpectrographData", "DataManager"]
 import dataclasses
 
 import astropy.io.fits
-import astropy.table
 import astropy.time
-import astropy.units as u
+import astropy.units
 import numpy as np
 
 # The version of the FITS file format produced by this class.
 FORMAT_VERSION = 1
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class SpectrographData:
     """Class to hold data and metadata from a fiber spectrograph."""
 
@@ -52,10 +51,10 @@ class SpectrographData:
     source: str
     """The light source that was measured (see the XML `expose.source` field).
     """
-    temperature: astropy.units.Quantity
-    """The internal spectrograph temperature."""
-    temperature_setpoint: astropy.units.Quantity
-    """The internal spectrograph temperature set point."""
+    temperature: float
+    """The internal spectrograph temperature (degC)."""
+    temperature_setpoint: float
+    """The internal spectrograph temperature set point (degC)."""
     n_pixels: int
     """The number of pixels in the detector."""
 
@@ -82,6 +81,8 @@ class DataManager:
         self.instrument = instrument
         self.origin = origin
         self.serial = serial
+        # WCS header templates, keyed by wavelength unit name.
+        self._wcs_headers = {}
 
     def make_hdulist(self, data):
         """Generate a FITS hdulist built from SpectrographData.
@@ -112,66 +113,98 @@ class DataManager:
         hdr["CSCNAME"] = (self.origin, "Name of the CSC that produced this data.")
         hdr["LOCATN"] = (None, "Location of Instrument.")
         hdr["DETSIZE"] = data.n_pixels
-        hdr["DATE-BEG"] = astropy.time.Time(data.date_begin).tai.fits
-        hdr["DATE-END"] = astropy.time.Time(data.date_end).tai.fits
-        hdr["DAYOBS"] = int(astropy.time.Time(data.date_begin).tai.strftime("%Y%m%d"))
+        date_begin = astropy.time.Time(data.date_begin, copy=False).tai
+        hdr["DATE-BEG"] = date_begin.fits
+        hdr["DATE-END"] = astropy.time.Time(data.date_end, copy=False).tai.fits
+        hdr["DAYOBS"] = int(date_begin.strftime("%Y%m%d"))
         hdr["EXPTIME"] = (data.duration, "Duration of scan.")
         hdr["TIMESYS"] = "TAI"
         hdr["IMGTYPE"] = "spectrum"  # Temporary, tickets/DM-38311 for update
         hdr["SOURCE"] = data.source
-        hdr["TEMP_SET"] = (
-            data.temperature_setpoint.to_value(u.deg_C),
-            "[degC] Temperature set point.",
-        )
-        hdr["CCDTEMP"] = (
-            data.temperature.to_value(u.deg_C),
-            "[degC] Measured Temperature.",
-        )
+        hdr["TEMP_SET"] = (data.temperature_setpoint, "[degC] Temperature set point.")
+        hdr["CCDTEMP"] = (data.temperature, "[degC] Measured Temperature.")
 
         # WCS headers - Use -TAB WCS definition
-        wcs_cards = [
-            "WCSAXES =                    1 / Number of WCS axes",
-            "CRPIX1  =                  0.0 / Reference pixel on axis 1",
-            "CRVAL1  =                  0.0 / Value at ref. pixel on axis 1",
-            "CNAME1  = 'Wavelength'         / Axis name for labeling purposes",
-            "CTYPE1  = 'WAVE-TAB'           / Wavelength axis by lookup table",
-            "CDELT1  =                  1.0 / Pixel size on axis 1",
-            f"CUNIT1  = '{data.wavelength.unit.name:8s}'           / Units for axis 1",
-            f"PV1_1   = {self.wcs_table_ver:20d} / EXTVER  of bintable extension for -TAB arrays",
-            f"PS1_0   = '{self.wcs_table_name:8s}'           / EXTNAME of bintable extension for -TAB arrays",
-            f"PS1_1   = '{self.wcs_column_name:8s}'         / Wavelength coordinate array",
-        ]
-        for c in wcs_cards:
-            hdr.append(astropy.io.fits.Card.fromstring(c))
+        hdr.extend(self.make_wcs_header(data.wavelength.unit.name))
 
         return hdr
 
+    def make_wcs_header(self, unit_name):
+        """Return the -TAB WCS header cards for the wavelength axis.
+
+        The cards only depend on the wavelength unit, so they are built once
+        per unit and a copy of that template is returned.
+
+        Parameters
+        ----------
+        unit_name : `str`
+            Name of the wavelength unit.
+
+        Returns
+        -------
+        header : `astropy.io.fits.Header`
+            The WCS header cards.
+        """
+        header = self._wcs_headers.get(unit_name)
+        if header is None:
+            wcs_cards = [
+                ("WCSAXES", 1, "Number of WCS axes"),
+                ("CRPIX1", 0.0, "Reference pixel on axis 1"),
+                ("CRVAL1", 0.0, "Value at ref. pixel on axis 1"),
+                ("CNAME1", "Wavelength", "Axis name for labeling purposes"),
+                ("CTYPE1", "WAVE-TAB", "Wavelength axis by lookup table"),
+                ("CDELT1", 1.0, "Pixel size on axis 1"),
+                ("CUNIT1", unit_name, "Units for axis 1"),
+                (
+                    "PV1_1",
+                    self.wcs_table_ver,
+                    "EXTVER  of bintable extension for -TAB arrays",
+                ),
+                (
+                    "PS1_0",
+                    self.wcs_table_name,
+                    "EXTNAME of bintable extension for -TAB arrays",
+                ),
+                ("PS1_1", self.wcs_column_name, "Wavelength coordinate array"),
+            ]
+            header = astropy.io.fits.Header(
+                [astropy.io.fits.Card(*card) for card in wcs_cards]
+            )
+            self._wcs_headers[unit_name] = header
+        return header.copy()
+
     def make_primary_hdu(self, data):
         """Return the primary HDU built from SpectrographData."""
 
+        # Pass a C-contiguous array (a no-op for the spectrograph's readout)
+        # so that astropy does not have to copy it when writing. The dtype is
+        # left alone: the device returns float64 values, which need not be
+        # integers, so narrowing it would lose data.
+        spectrum = np.ascontiguousarray(data.spectrum)
         hdu = astropy.io.fits.PrimaryHDU(
-            data=data.spectrum, header=self.make_fits_header(data)
+            data=spectrum, header=self.make_fits_header(data)
         )
         return hdu
 
     def make_wavelength_hdu(self, data):
         """Return the wavelength HDU built from SpectrographData."""
 
-        # The wavelength array must be 2D (N, 1) in numpy but (1, N) in FITS
-        wavelength = data.wavelength.reshape([data.wavelength.size, 1])
-
-        # Create a Table. It will be a single element table
-        table = astropy.table.Table()
-
-        # Create the wavelength column
-        # Create the column explicitly since it is easier to ensure the
-        # shape this way.
-        wavecol = astropy.table.Column([wavelength], unit=wavelength.unit.name)
-
-        # The column name must match the PS1_1 entry from the primary HDU
-        table[self.wcs_column_name] = wavecol
+        # The wavelength array must be 2D (N, 1) in numpy but (1, N) in FITS.
+        # Build the single-row binary table column directly from the
+        # wavelength values, rather than going through an astropy Table.
+        n_pixels = data.wavelength.size
+        wavecol = astropy.io.fits.Column(
+            # The column name must match the PS1_1 entry from the primary HDU
+            name=self.wcs_column_name,
+            format=f"{n_pixels}D",
+            dim=f"(1,{n_pixels})",
+            unit=data.wavelength.unit.name,
+            array=data.wavelength.value.reshape(1, n_pixels, 1),
+        )
 
         # The name MUST match the value of PS1_0 and the version MUST
         # match the value of PV1_1
-        hdu = astropy.io.fits.BinTableHDU(table, name=self.wcs_table_name, ver=1)
+        hdu = astropy.io.fits.BinTableHDU.from_columns(
+            [wavecol], name=self.wcs_table_name, ver=1
+        )
         return hdu
@@ -21,10 +21,12 @@
 
 import asyncio
 import contextlib
+import ctypes
 import io
 import itertools
 import logging
 import struct
+import threading
 import time
 import unittest
 import unittest.mock
@@ -42,7 +44,11 @@ from lsst.ts.fiberspectrograph import (
     AvsReturnError,
     AvsSimulator,
 )
-from lsst.ts.fiberspectrograph.avs_fiber_spectrograph import MAX_DURATION, MIN_DURATION
+from lsst.ts.fiberspectrograph.avs_fiber_spectrograph import (
+    _LIBAVS_PROTOTYPES,
+    MAX_DURATION,
+    MIN_DURATION,
+)
 
 
 class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
@@ -78,6 +84,104 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         self.patch.return_value.AVS_GetNumPixels.assert_called_once()
         assert spec.device == self.id0
 
+    def test_connect_on_libavs_thread(self):
+        """Test that connecting calls libavs from the libavs thread."""
+        threads = []
+
+        def record_thread(*args):
+            threads.append(threading.current_thread().name)
+            return unittest.mock.DEFAULT
+
+        self.patch.return_value.AVS_UpdateUSBDevices.side_effect = record_thread
+        self.patch.return_value.AVS_Activate.side_effect = record_thread
+        AvsFiberSpectrograph()
+        assert len(threads) == 2
+        assert all(name.startswith("avs-ffi") for name in threads)
+
+    async def test_create_in_thread(self):
+        """Test that an instance made in a worker thread, as the CSC does,
+        can take exposures on the event loop.
+        """
+        spec = await asyncio.to_thread(AvsFiberSpectrograph)
+        assert spec.check_expose_ok(0.1) is None
+        result = await spec.expose(0.1)
+        np.testing.assert_array_equal(result[1], self.spectrum)
+        await spec.disconnect_async()
+
+    def test_connect_readout_buffers(self):
+        """Test that the exposure readout buffers are cache-line aligned."""
+        spec = AvsFiberSpectrograph()
+        for buffer in (spec._wavelength_buf, spec._spectrum_buf):
+            assert buffer.shape == (self.n_pixels,)
+            assert buffer.ctypes.data % 64 == 0
+            assert buffer.flags.c_contiguous
+
+    def test_connect_rechecks_device_status(self):
+        """Test that a second connection enumerates the USB devices again,
+        and so refuses a device that the first connection is using.
+        """
+        spec = AvsFiberSpectrograph()
+        assert spec.device == self.id0
+        self.id0.Status = AvsDeviceStatus.USB_IN_USE_BY_APPLICATION.value
+
+        with pytest.raises(
+            RuntimeError, match="Requested AVS device is already in use"
+        ):
+            AvsFiberSpectrograph()
+        assert self.patch.return_value.AVS_UpdateUSBDevices.call_count == 2
+        assert self.patch.return_value.AVS_GetList.call_count == 2
+        self.patch.return_value.AVS_Activate.assert_called_once()
+
+    def test_shared_library(self):
+        """Test that instances share one library, which is only closed when
+        the last instance disconnects.
+        """
+        spec1 = AvsFiberSpectrograph()
+        spec2 = AvsFiberSpectrograph()
+        self.patch.assert_called_once()
+        self.patch.return_value.AVS_Init.assert_called_once_with(0)
+        assert spec1.libavs is spec2.libavs
+
+        spec1.disconnect()
+        self.patch.return_value.AVS_Done.assert_not_called()
+        spec2.disconnect()
+        self.patch.return_value.AVS_Done.assert_called_once_with()
+
+    def test_shared_library_replaced(self):
+        """Test that instances holding a library keep sharing it after
+        another simulator replaces the library for new instances.
+        """
+        spec1 = AvsFiberSpectrograph()
+        spec2 = AvsFiberSpectrograph()
+        patch2 = AvsSimulator().start(testCase=self)
+        spec3 = AvsFiberSpectrograph()
+        assert spec3.libavs is patch2.return_value
+        assert spec1.libavs is self.patch.return_value
+
+        spec1.disconnect()
+        self.patch.return_value.AVS_Done.assert_not_called()
+        spec2.disconnect()
+        self.patch.return_value.AVS_Done.assert_called_once_with()
+        patch2.return_value.AVS_Done.assert_not_called()
+        spec3.disconnect()
+        patch2.return_value.AVS_Done.assert_called_once_with()
+
+    def test_prototypes(self):
+        """Test that every libavs function we call has its C prototype
+        declared.
+        """
+        AvsFiberSpectrograph()
+        libavs = self.patch.return_value
+        for name, (restype, argtypes) in _LIBAVS_PROTOTYPES.items():
+            with self.subTest(name=name):
+                assert getattr(libavs, name).restype is restype
+                assert getattr(libavs, name).argtypes == argtypes
+        # Handles are C long, and Deactivate returns a C bool.
+        assert libavs.AVS_Activate.restype is ctypes.c_long
+        assert libavs.AVS_Deactivate.restype is ctypes.c_bool
+        called = {name for name, _, _ in libavs.mock_calls if name.startswith("AVS_")}
+        assert called <= _LIBAVS_PROTOTYPES.keys()
+
     def test_create_with_logger(self):
         """Test that a passed-in logger is used for log messages."""
         log = logging.Logger("testingLogger")
@@ -96,6 +200,14 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         # simple check that the instance was created successfully
         assert spec.device == self.id0
 
+        # A second instance must not add a second handler.
+        spec.disconnect()
+        capture = io.StringIO()
+        with contextlib.redirect_stdout(capture):
+            spec = AvsFiberSpectrograph(log_to_stdout=True)
+            spec = AvsFiberSpectrograph(log_to_stdout=True)
+        assert capture.getvalue().count("Activated connection") == 2
+
     def test_connect_serial_number(self):
         """Test connecting to a device with a specific serial number."""
         serial_number = "54321"
@@ -120,6 +232,37 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         self.patch.return_value.AVS_Activate.assert_called_with(id1)
         assert spec.device == id1
 
+    def test_connect_duplicate_serial_number(self):
+        """Test that the first of two devices with the same serial number
+        is used.
+        """
+        serial_number = "54321"
+        n_devices = 2
+        id1 = AvsIdentity(
+            bytes(str(serial_number), "ascii"),
+            b"Fake Spectrograph 2",
+            AvsDeviceStatus.USB_AVAILABLE.value,
+        )
+        id2 = AvsIdentity(
+            bytes(str(serial_number), "ascii"),
+            b"Fake Spectrograph 3",
+            AvsDeviceStatus.USB_AVAILABLE.value,
+        )
+
+        def mock_getList(a_listSize, a_pRequiredSize, a_pList):
+            """Pretend that two devices with one serial number are
+            connected.
+            """
+            a_pList[:] = [id1, id2]
+            return n_devices
+
+        self.patch.return_value.AVS_GetList.side_effect = mock_getList
+        self.patch.return_value.AVS_UpdateUSBDevices.return_value = n_devices
+
+        spec = AvsFiberSpectrograph(serial_number=serial_number)
+        self.patch.return_value.AVS_Activate.assert_called_once_with(id1)
+        assert spec.device == id1
+
     def test_connect_no_serial_number_two_devices_fails(self):
         serial_number = "54321"
         n_devices = 2
@@ -319,6 +462,19 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         self.patch.return_value.AVS_Deactivate.assert_called_once_with(self.handle)
         self.patch.return_value.AVS_Done.assert_called_once_with()
 
+    def test_disconnect_context_manager(self):
+        """Test that the connection is closed on leaving a ``with`` block,
+        and not closed again when the object is deleted.
+        """
+        with AvsFiberSpectrograph() as spec:
+            self.patch.return_value.AVS_Deactivate.assert_not_called()
+        self.patch.return_value.AVS_Deactivate.assert_called_once_with(self.handle)
+        self.patch.return_value.AVS_Done.assert_called_once_with()
+        assert spec.handle is None
+        del spec
+        self.patch.return_value.AVS_Deactivate.assert_called_once_with(self.handle)
+        self.patch.return_value.AVS_Done.assert_called_once_with()
+
     def test_disconnect_other_exception(self):
         """Test that disconnect continues if there some other exception raised
         during disconnect.
@@ -329,6 +485,13 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
             spec.disconnect()
         self.patch.return_value.AVS_Deactivate.assert_called_once_with(self.handle)
         self.patch.return_value.AVS_Done.assert_called_once_with()
+        assert spec.handle is None
+
+        # Disconnecting again must not try to deactivate the device again.
+        with self.assertNoLogs(spec.log, "ERROR"):
+            spec.disconnect()
+        self.patch.return_value.AVS_Deactivate.assert_called_once_with(self.handle)
+        self.patch.return_value.AVS_Done.assert_called_once_with()
 
     def test_get_status(self):
         spec = AvsFiberSpectrograph()
@@ -345,6 +508,40 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         # (we're not worried about the contents of it here)
         status = spec.get_status(full=True)
         assert status.config is not None
+        # The returned config must not be the reused scratch buffer.
+        assert spec.get_status(full=True).config is not status.config
+
+    def test_get_status_cached(self):
+        """Only the analog input is read on every status request."""
+        spec = AvsFiberSpectrograph()
+        spec.get_status()
+        spec.get_status()
+        self.patch.return_value.AVS_GetVersionInfo.assert_called_once()
+        self.patch.return_value.AVS_GetParameter.assert_called_once()
+        assert self.patch.return_value.AVS_GetAnalogIn.call_count == 2
+
+        spec.refresh_static()
+        assert self.patch.return_value.AVS_GetVersionInfo.call_count == 2
+        status = spec.get_status(full=True)
+        assert self.patch.return_value.AVS_GetParameter.call_count == 3
+        assert status.fpga_version == self.fpga_version
+
+    def test_refresh_static_shorter_version(self):
+        """A shorter version string must not keep the tail of the last one."""
+        spec = AvsFiberSpectrograph()
+        assert spec.get_status().fpga_version == self.fpga_version
+
+        def mock_getVersionInfo(
+            handle, a_pFPGAVersion, a_pFirmwareVersion, a_pLibVersion
+        ):
+            a_pFPGAVersion[:3] = b"new"
+            return 0
+
+        self.patch.return_value.AVS_GetVersionInfo.side_effect = mock_getVersionInfo
+        spec.refresh_static()
+        status = spec.get_status()
+        assert status.fpga_version == "new"
+        assert status.firmware_version == ""
 
     def test_get_status_getVersionInfo_fails(self):
         spec = AvsFiberSpectrograph()
@@ -390,11 +587,31 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         assert self.patcher.measure_config_sent.StartPixel == 0
         assert self.patcher.measure_config_sent.StopPixel == self.n_pixels - 1
         assert self.patcher.measure_config_sent.NrAverages == 1
-        self.patch.return_value.AVS_Measure.assert_called_once_with(self.handle, 0, 1)
-        assert self.patch.return_value.AVS_PollScan.call_count == 4
+        self.patch.return_value.AVS_Measure.assert_called_once_with(
+            self.handle, unittest.mock.ANY, 1
+        )
+        # The measurement callback means we never have to poll.
+        self.patch.return_value.AVS_PollScan.assert_not_called()
         np.testing.assert_array_equal(result[0].to_value(u.nm), self.wavelength)
         np.testing.assert_array_equal(result[1], self.spectrum)
 
+    async def test_expose_not_on_event_loop(self):
+        """Test that libavs calls are made on the libavs thread, not on the
+        event loop's thread.
+        """
+        threads = []
+        get_scope_data = self.patch.return_value.AVS_GetScopeData.side_effect
+
+        def mock_getScopeData(*args):
+            threads.append(threading.current_thread())
+            return get_scope_data(*args)
+
+        self.patch.return_value.AVS_GetScopeData.side_effect = mock_getScopeData
+        spec = AvsFiberSpectrograph()
+        await spec.expose(0.1)
+        assert threads != [threading.current_thread()]
+        assert threads[0].name.startswith("avs-ffi")
+
     async def test_expose_raises_if_active_exposure(self):
         """Starting a new exposure while one is currently active should
         raise.
@@ -410,9 +627,30 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         await task
         # in addition to raising, should have only called these functions once
         self.patch.return_value.AVS_PrepareMeasure.assert_called_once()
-        self.patch.return_value.AVS_Measure.assert_called_once_with(self.handle, 0, 1)
+        self.patch.return_value.AVS_Measure.assert_called_once_with(
+            self.handle, unittest.mock.ANY, 1
+        )
         self.patch.return_value.AVS_GetScopeData.assert_called_once()
 
+    async def test_measurements_serialized(self):
+        """Measurements started concurrently on one device are taken one at
+        a time, in the order they were requested.
+        """
+        duration = 0.05  # seconds
+        spec = AvsFiberSpectrograph()
+        calls = self.patch.return_value.mock_calls
+
+        results = await asyncio.gather(
+            spec._do_expose(duration), spec._do_expose(duration)
+        )
+        assert len(results) == 2
+        names = [
+            name
+            for name, _, _ in calls
+            if name in ("AVS_PrepareMeasure", "AVS_GetScopeData")
+        ]
+        assert names == ["AVS_PrepareMeasure", "AVS_GetScopeData"] * 2
+
     async def test_expose_prepare_fails(self):
         duration = 0.5  # seconds
         self.patch.return_value.AVS_PrepareMeasure.side_effect = None
@@ -437,7 +675,9 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         with pytest.raises(AvsReturnError, match="Measure"):
             await spec.expose(duration)
         self.patch.return_value.AVS_PrepareMeasure.assert_called_once()
-        self.patch.return_value.AVS_Measure.assert_called_once_with(self.handle, 0, 1)
+        self.patch.return_value.AVS_Measure.assert_called_once_with(
+            self.handle, unittest.mock.ANY, 1
+        )
 
     async def test_expose_GetLambda_fails(self):
         duration = 0.5  # seconds
@@ -450,11 +690,41 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         with pytest.raises(AvsReturnError, match="GetLambda"):
             await spec.expose(duration)
         self.patch.return_value.AVS_PrepareMeasure.assert_called_once()
-        self.patch.return_value.AVS_Measure.assert_called_once_with(self.handle, 0, 1)
+        self.patch.return_value.AVS_Measure.assert_called_once_with(
+            self.handle, unittest.mock.ANY, 1
+        )
+        self.patch.return_value.AVS_PollScan.assert_not_called()
+        self.patch.return_value.AVS_StopMeasure.assert_called_once_with(self.handle)
+
+    async def test_expose_callback_fails(self):
+        """Test that an error code passed to the measurement callback
+        raises.
+        """
+        duration = 0.2  # seconds
+        self.patcher.measure_result = AvsReturnCode.ERR_INVALID_MEAS_DATA.value
+
+        spec = AvsFiberSpectrograph()
+        with pytest.raises(AvsReturnError, match="Measure.*ERR_INVALID_MEAS_DATA"):
+            await spec.expose(duration)
         self.patch.return_value.AVS_PollScan.assert_not_called()
+        self.patch.return_value.AVS_GetScopeData.assert_not_called()
+
+    async def test_expose_no_callback(self):
+        """Test that `expose` falls back to polling if the measurement
+        callback is never called.
+        """
+        duration = 0.2  # seconds
+        # Measure will never call the callback.
+        self.patch.return_value.AVS_Measure.side_effect = None
+
+        spec = AvsFiberSpectrograph()
+        result = await spec.expose(duration)
+        self.patch.return_value.AVS_PollScan.assert_called_once_with(self.handle)
+        np.testing.assert_array_equal(result[1], self.spectrum)
 
     async def test_expose_PollScan_fails(self):
-        duration = 0.5  # seconds
+        duration = 0.2  # seconds
+        self.patch.return_value.AVS_Measure.side_effect = None
         self.patch.return_value.AVS_PollScan.side_effect = None
         self.patch.return_value.AVS_PollScan.return_value = (
             AvsReturnCode.ERR_INVALID_DEVICE_ID.value
@@ -464,7 +734,9 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         with pytest.raises(AvsReturnError, match="PollScan"):
             await spec.expose(duration)
         self.patch.return_value.AVS_PrepareMeasure.assert_called_once()
-        self.patch.return_value.AVS_Measure.assert_called_once_with(self.handle, 0, 1)
+        self.patch.return_value.AVS_Measure.assert_called_once_with(
+            self.handle, unittest.mock.ANY, 1
+        )
         self.patch.return_value.AVS_PollScan.assert_called_once_with(self.handle)
 
     async def test_expose_PollScan_timeout(self):
@@ -472,21 +744,56 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         polling.
         """
         duration = 0.5  # seconds
-        # Have the PollScan just run forever.
+        # Never call the callback and never have data available.
+        self.patch.return_value.AVS_Measure.side_effect = None
         self.patch.return_value.AVS_PollScan.side_effect = itertools.repeat(0)
 
         spec = AvsFiberSpectrograph()
         # asyncio.TimeoutError would be raised if the `wait_for` times out,
         # but the message would not include this text.
         with pytest.raises(
-            asyncio.TimeoutError, match="Timeout polling for exposure to be ready"
+            asyncio.TimeoutError, match="Timeout waiting for exposure to be ready"
         ):
             # Use `wait_for` to keep `expose` from hanging if there is a bug.
             await asyncio.wait_for(spec.expose(duration), 2)
         self.patch.return_value.AVS_PrepareMeasure.assert_called_once()
-        self.patch.return_value.AVS_Measure.assert_called_once_with(self.handle, 0, 1)
-        # PollScan will be called a hundred times or so.
-        self.patch.return_value.AVS_PollScan.assert_called()
+        self.patch.return_value.AVS_Measure.assert_called_once_with(
+            self.handle, unittest.mock.ANY, 1
+        )
+        # PollScan is only called once, as a fallback.
+        self.patch.return_value.AVS_PollScan.assert_called_once_with(self.handle)
+        # The measurement is stopped, so libavs cannot call the old callback.
+        self.patch.return_value.AVS_StopMeasure.assert_called_once_with(self.handle)
+
+    async def test_expose_unstopped_measurement(self):
+        """Test that a measurement that could not be stopped is stopped
+        before the next one replaces its callback.
+        """
+        duration = 0.2  # seconds
+        self.patch.return_value.AVS_Measure.side_effect = None
+        self.patch.return_value.AVS_PollScan.side_effect = itertools.repeat(0)
+        self.patch.return_value.AVS_StopMeasure.side_effect = None
+        self.patch.return_value.AVS_StopMeasure.return_value = (
+            AvsReturnCode.ERR_TIMEOUT.value
+        )
+
+        spec = AvsFiberSpectrograph()
+        with self.assertLogs(spec.log, "ERROR"):
+            with pytest.raises(asyncio.TimeoutError):
+                await spec.expose(duration)
+        callback = spec._measure_callback
+
+        # The next exposure must not start while the stop keeps failing.
+        with pytest.raises(AvsReturnError, match="StopMeasure"):
+            await spec.expose(duration)
+        self.patch.return_value.AVS_PrepareMeasure.assert_called_once()
+        assert spec._measure_callback is callback
+
+        self.patch.return_value.AVS_StopMeasure.return_value = 0
+        self.patch.return_value.AVS_PollScan.side_effect = None
+        result = await spec.expose(duration)
+        np.testing.assert_array_equal(result[1], self.spectrum)
+        assert self.patch.return_value.AVS_StopMeasure.call_count == 3
 
     async def test_expose_GetScopeData_fails(self):
         duration = 0.5  # seconds
@@ -499,8 +806,10 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         with pytest.raises(AvsReturnError, match="GetScopeData"):
             await spec.expose(duration)
         self.patch.return_value.AVS_PrepareMeasure.assert_called_once()
-        self.patch.return_value.AVS_Measure.assert_called_once_with(self.handle, 0, 1)
-        assert self.patch.return_value.AVS_PollScan.call_count == 4
+        self.patch.return_value.AVS_Measure.assert_called_once_with(
+            self.handle, unittest.mock.ANY, 1
+        )
+        self.patch.return_value.AVS_PollScan.assert_not_called()
 
     async def test_expose_duration_out_of_range(self):
         """The vendor docs specify 0.002ms - 600s as valid durations."""
@@ -555,23 +864,23 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         assert t1 - t0 < 1
         self.patch.return_value.AVS_StopMeasure.assert_called_with(self.handle)
 
-    async def test_stop_exposure_during_poll_loop(self):
+    async def test_stop_exposure_waiting_for_data(self):
         """Test that `stop_exposure` ends the active `expose` when called
-        during the `PollData` loop.
+        after the integration time, while waiting for the data to be ready.
         """
         duration = 0.2  # seconds
-        # repeat "no data" forever, so that `stop` will trigger during polling
-        self.patch.return_value.AVS_PollScan.side_effect = itertools.repeat(0)
+        # Never call the callback, so that `stop` will trigger while waiting.
+        self.patch.return_value.AVS_Measure.side_effect = None
         spec = AvsFiberSpectrograph()
 
         task = asyncio.create_task(spec.expose(duration))
-        await asyncio.sleep(duration + 0.1)  # wait until we are in the poll loop
+        await asyncio.sleep(duration + 0.1)  # wait until we are waiting for data
         spec.stop_exposure()
         with pytest.raises(asyncio.CancelledError):
             await task
 
         self.patch.return_value.AVS_StopMeasure.assert_called_with(self.handle)
-        self.patch.return_value.AVS_PollScan.assert_called_with(self.handle)
+        self.patch.return_value.AVS_PollScan.assert_not_called()
         self.patch.return_value.AVS_GetScopeData.assert_not_called()
 
     async def test_stop_exposure_no_expose_running(self):
@@ -655,6 +964,50 @@ class TestAvsFiberSpectrograph(unittest.IsolatedAsyncioTestCase):
         self.patch.return_value.AVS_Done.assert_called_once_with()
         assert spec.handle is None
 
+    async def test_get_status_async(self):
+        spec = AvsFiberSpectrograph()
+        status = await spec.get_status_async()
+        assert status == spec.get_status()
+        assert status.config is None
+
+        status = await spec.get_status_async(full=True)
+        assert status.config is not None
+        await spec.refresh_static_async()
+        assert self.patch.return_value.AVS_GetParameter.call_count == 3
+
+    async def test_stop_exposure_async(self):
+        """Test that `stop_exposure_async` ends the active `expose`."""
+        duration = 5  # seconds
+        spec = AvsFiberSpectrograph()
+
+        task = asyncio.create_task(spec.expose(duration))
+        await asyncio.sleep(0.1)  # give the event loop time to start
+        await spec.stop_exposure_async()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        self.patch.return_value.AVS_StopMeasure.assert_called_once_with(self.handle)
+
+        # Nothing to stop now.
+        await spec.stop_exposure_async()
+        self.patch.return_value.AVS_StopMeasure.assert_called_once_with(self.handle)
+
+    async def test_disconnect_async(self):
+        """Test that `disconnect_async` cancels an active exposure and
+        closes the connection.
+        """
+        duration = 5  # seconds
+        spec = AvsFiberSpectrograph()
+
+        task = asyncio.create_task(spec.expose(duration))
+        await asyncio.sleep(0.1)  # give the event loop time to start
+        await spec.disconnect_async()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        self.patch.return_value.AVS_StopMeasure.assert_called_once_with(self.handle)
+        self.patch.return_value.AVS_Deactivate.assert_called_once_with(self.handle)
+        self.patch.return_value.AVS_Done.assert_called_once_with()
+        assert spec.handle is None
+
 
 class TestAvsReturnError(unittest.TestCase):
     """Tests of the string representations of AvsReturnError exceptions."""
@@ -710,6 +1063,24 @@ class TestAvsDeviceConfig(unittest.TestCase):
         config.TecControl_m_Enable = True
         assert config.TecControl_m_Enable
 
+    def test_as_record(self):
+        """Test that the numpy record shares memory with the struct."""
+        config = AvsDeviceConfig()
+        config.Detector_m_NrPixels = 2048
+        config.TecControl_m_Setpoint = -5.5
+        config.SpectrumCorrect[4095] = 1.25
+        config.aUserFriendlyId = b"blue"
+
+        record = config.as_record()
+        assert record["Detector_m_NrPixels"] == 2048
+        assert record["TecControl_m_Setpoint"] == -5.5
+        assert record["SpectrumCorrect"].shape == (4096,)
+        assert record["SpectrumCorrect"][4095] == 1.25
+        assert record["aUserFriendlyId"] == b"blue"
+
+        config.EthernetSettings_m_TcpPort = 1234
+        assert record["EthernetSettings_m_TcpPort"] == 1234
+
 
 class TestAvsMeasureConfig(unittest.TestCase):
     def test_frozen(self):
@@ -743,6 +1114,29 @@ class TestAvsIdentity(unittest.TestCase):
         assert name in string
         assert "USB_IN_USE_BY_OTHER" in string  # from the "Status" field
 
+    def test_eq(self):
+        """Test that identities compare equal field-for-field."""
+        identity = AvsIdentity(b"12345", b"some name", 1)
+        assert identity == AvsIdentity(b"12345", b"some name", 1)
+        assert hash(identity) == hash(AvsIdentity(b"12345", b"some name", 1))
+        assert identity != AvsIdentity(b"12346", b"some name", 1)
+        assert identity != AvsIdentity(b"12345", b"other name", 1)
+        assert identity != AvsIdentity(b"12345", b"some name", 2)
+        assert identity != "12345"
+
+    def test_eq_ignores_bytes_after_nul(self):
+        """Test that stale bytes after a field's NUL terminator do not
+        affect comparisons.
+        """
+        identity = AvsIdentity(b"123", b"some name", 1)
+        raw = bytearray(bytes(identity))
+        raw[4:9] = b"stale"
+        stale = AvsIdentity.from_buffer_copy(raw)
+        assert stale.SerialNumber == b"123"
+        assert bytes(stale) != bytes(identity)
+        assert stale == identity
+        assert hash(stale) == hash(identity)
+
     def test_frozen(self):
         """Test that we cannot assign new attributes to this struct,
         but that we can modify existing attributes.
@@ -307,6 +307,48 @@ class TestFiberSpectrographCsc(
             # Delete the file on success; leave it on failure, for diagnosis
             pathlib.Path(filepath).unlink()
 
+    async def test_save_fails(self):
+        """Test that an exposure that cannot be saved puts us in FAULT
+        and discards any other exposures waiting to be saved.
+        """
+        async with self.make_csc(
+            initial_state=salobj.State.ENABLED,
+            simulation_mode=fiberspectrograph.SimulationMode.S3Server,
+            config_dir=TEST_CONFIG_DIR,
+        ):
+            await self.assert_next_summary_state(salobj.State.ENABLED)
+            await self.assert_next_sample(
+                topic=self.remote.evt_errorCode, errorCode=0, errorReport=""
+            )
+
+            async def hang_get_next_obs_id(num_images):
+                await asyncio.Future()
+
+            self.csc.image_service_client.get_next_obs_id = hang_get_next_obs_id
+            # Saving the first exposure waits for the image name service
+            # until it times out, so the second exposure is left queued.
+            self.csc.image_service_timeout = STD_TIMEOUT
+            # Both commands succeed: exposures are saved in the background.
+            for _ in range(2):
+                await self.remote.cmd_expose.set_start(
+                    timeout=STD_TIMEOUT, duration=0.1
+                )
+
+            await self.assert_next_summary_state(
+                salobj.State.FAULT, timeout=STD_TIMEOUT + LONG_TIMEOUT
+            )
+            error = await self.remote.evt_errorCode.next(
+                flush=False, timeout=STD_TIMEOUT
+            )
+            assert error.errorCode == 21
+            assert "TimeoutError" in error.errorReport
+            while True:
+                message = await self.remote.evt_logMessage.next(
+                    flush=False, timeout=STD_TIMEOUT
+                )
+                if "Discarding unsaved exposure" in message.message:
+                    break
+
     @pytest.mark.skip("DM-43549")
     async def test_expose_fails(self):
         """Test that a failed exposure puts us in the FAULT state, which will
@@ -367,7 +409,8 @@ class TestFiberSpectrographCsc(
         """Test that an exposure whose read times out puts us in FAULT and
         exposureState is set to TIMEOUT.
         """
-        # Have the PollScan just run forever.
+        # Never call the measurement callback and never have data available.
+        self.patch.return_value.AVS_Measure.side_effect = None
         self.patch.return_value.AVS_PollScan.side_effect = itertools.repeat(0)
 
         async with self.make_csc(
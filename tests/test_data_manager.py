@@ -44,8 +44,8 @@ class TestDataManager(unittest.TestCase):
         self.date_end = self.date_begin + astropy.time.TimeDelta(
             self.duration, format="sec"
         )
-        self.temperature = -273 * u.deg_C
-        self.temperature_setpoint = -274 * u.deg_C
+        self.temperature = -273.0  # degC
+        self.temperature_setpoint = -274.0  # degC
         self.type = "totally real data"
         self.source = "blacklight"
         self.data = SpectrographData(
@@ -75,10 +75,8 @@ class TestDataManager(unittest.TestCase):
             "TIMESYS": "TAI",
             "IMGTYPE": "spectrum",
             "SOURCE": self.source,
-            "TEMP_SET": self.temperature_setpoint.to_value(u.deg_C),
-            "CCDTEMP": self.temperature.to_value(
-                u.deg_C,
-            ),
+            "TEMP_SET": self.temperature_setpoint,
+            "CCDTEMP": self.temperature,
             # WCS headers
             "CTYPE1": "WAVE-TAB",
             "PS1_0": "WCS-TAB",
@@ -112,6 +110,18 @@ class TestDataManager(unittest.TestCase):
         header = manager.make_fits_header(self.data)
         self.check_header(header)
 
+    def test_make_wcs_header(self):
+        manager = DataManager(
+            instrument=self.instrument, origin=self.origin, serial=self.serial
+        )
+        header = manager.make_wcs_header("nm")
+        assert header["CUNIT1"] == "nm"
+        assert header["PS1_0"] == manager.wcs_table_name
+        # Changing a returned header must not change the next one.
+        header["CUNIT1"] = "m"
+        assert manager.make_wcs_header("nm")["CUNIT1"] == "nm"
+        assert manager.make_wcs_header("Angstrom")["CUNIT1"] == "Angstrom"
+
     def test_make_primary_hdu(self):
         manager = DataManager(
             instrument=self.instrument, origin=self.origin, serial=self.serial
@@ -123,6 +133,16 @@ class TestDataManager(unittest.TestCase):
         # The flux data should be a Primary HDU.
         assert isinstance(hdu, astropy.io.fits.PrimaryHDU)
 
+    def test_make_primary_hdu_noncontiguous(self):
+        manager = DataManager(
+            instrument=self.instrument, origin=self.origin, serial=self.serial
+        )
+        self.data.spectrum = np.repeat(self.spectrum, 2)[::2]
+        hdu = manager.make_primary_hdu(self.data)
+        assert hdu.data.flags.c_contiguous
+        assert hdu.data.dtype == np.float64
+        np.testing.assert_array_equal(hdu.data, self.spectrum)
+
     def test_make_wavelength_hdu(self):
         manager = DataManager(
             instrument=self.instrument, origin=self.origin, serial=self.serial
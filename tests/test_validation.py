@@ -41,6 +41,34 @@ class ValidationTestCase(unittest.TestCase):
         )
         self.validator.validate(config)
 
+    def test_telemetry_interval(self):
+        config = dict(
+            s3instance="a.valid.value",
+            image_service_url="http://comcam-mcm.tu.lsst.org",
+            location="test",
+            telemetry_interval=2.5,
+        )
+        self.validator.validate(config)
+        for bad_interval in (0, -1, "10"):
+            config["telemetry_interval"] = bad_interval
+            with self.subTest(telemetry_interval=bad_interval):
+                with pytest.raises(jsonschema.exceptions.ValidationError):
+                    self.validator.validate(config)
+
+    def test_upload_stop_timeout(self):
+        config = dict(
+            s3instance="a.valid.value",
+            image_service_url="http://comcam-mcm.tu.lsst.org",
+            location="test",
+            upload_stop_timeout=0,
+        )
+        self.validator.validate(config)
+        for bad_timeout in (-1, "5"):
+            config["upload_stop_timeout"] = bad_timeout
+            with self.subTest(upload_stop_timeout=bad_timeout):
+                with pytest.raises(jsonschema.exceptions.ValidationError):
+                    self.validator.validate(config)
+
     def test_invalid_configs(self):
         for bad_s3instance in (
             "1BadName",  # No uppercase